@@ -75,9 +75,25 @@ function computeMeasurements(data: any): {
   waistCm: number;
   hipCm: number;
 } {
-  // This is a placeholder implementation
-  // In a real implementation, you would extract measurements from the model data
-  // For now, we'll return some dummy values
+  // This route only calls Meshy or Hunyuan, which return no measurements, so today this
+  // branch is not taken. It accepts the fields the SPAR3D server's /inference returns,
+  // which are null unless a reference height was sent (the mesh has no metric scale).
+  const measured = data?.measurements;
+  if (
+    measured &&
+    ['heightCm', 'chestCm', 'waistCm', 'hipCm'].every(
+      (key) => typeof measured[key] === 'number' && Number.isFinite(measured[key]) && measured[key] > 0
+    )
+  ) {
+    return {
+      heightCm: measured.heightCm,
+      chestCm: measured.chestCm,
+      waistCm: measured.waistCm,
+      hipCm: measured.hipCm
+    };
+  }
+
+  // Meshy / Hunyuan and unscaled SPAR3D results: fall back to placeholder values
   return {
     heightCm: 175, // Height in centimeters
     chestCm: 95,   // Chest circumference in centimeters
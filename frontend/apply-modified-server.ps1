@@ -2,6 +2,12 @@
 Write-Host "Copying modified serve_rest.py to the container..."
 docker cp modified_serve_rest.py spar3d-local:/app/serve_rest.py
 
+# Copy the helper modules imported by serve_rest.py
+$helpers = @("spar3d_compile.py", "glb_writer.py", "texture_tiers.py", "memory_governor.py", "job_scheduler.py", "body_measurements.py", "fetch_checkpoints.py")
+foreach ($helper in $helpers) {
+    docker cp $helper spar3d-local:/app/$helper
+}
+
 # Stop the current server process
 Write-Host "Stopping the current server process..."
 docker exec spar3d-local pkill -f "uvicorn" 2>$null
@@ -10,8 +16,20 @@ docker exec spar3d-local pkill -f "uvicorn" 2>$null
 Write-Host "Starting the server with the modified file..."
 docker exec -d spar3d-local python3 /app/serve_rest.py
 
-Write-Host "Waiting for the server to start..."
-Start-Sleep -Seconds 5
+# /health answers right away; /ready turns 200 once the model has loaded
+Write-Host "Waiting for the model to load..."
+$deadline = (Get-Date).AddMinutes(10)
+do {
+    Start-Sleep -Seconds 5
+    try {
+        $ready = (Invoke-WebRequest -Uri http://localhost:3005/ready -UseBasicParsing -TimeoutSec 5).StatusCode -eq 200
+    } catch {
+        $ready = $false
+    }
+} until ($ready -or (Get-Date) -gt $deadline)
+if (-not $ready) {
+    Write-Host "Model not ready yet; check http://localhost:3005/ready and /config"
+}
 
 Write-Host "Server is now running with the /inference endpoint."
 Write-Host "You can test it with:"
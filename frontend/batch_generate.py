@@ -0,0 +1,282 @@
+"""
+Offline catalogue generation for SPAR3D.
+
+Replaces driving the container one HTTP call at a time from PowerShell. Reuses
+the serve_rest model loading and runs a three-stage pipeline:
+
+  decode + preprocess (thread pool) -> inference (accelerator) -> export + compression (process pool)
+
+with bounded queues in between so the accelerator is never waiting on I/O.
+Per-item status is appended to <out>/manifest.jsonl, so an interrupted run
+picks up where it stopped.
+
+Usage (inside the container):
+  python batch_generate.py ./data/skus --out ./data/catalogue --prompt "garment"
+  python batch_generate.py items.jsonl --out ./data/catalogue --texture-tiers standard
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+MANIFEST = "manifest.jsonl"
+
+
+def load_items(source, default_prompt, default_points):
+    """Items from a directory of images or a .jsonl / .csv manifest (id, image, prompt, points, reference_height_cm)."""
+    if os.path.isdir(source):
+        items = []
+        for name in sorted(os.listdir(source)):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in IMAGE_EXTENSIONS:
+                continue
+            prompt = default_prompt
+            # Optional <stem>.txt next to the image carries a per-item prompt
+            sidecar = os.path.join(source, stem + ".txt")
+            if os.path.exists(sidecar):
+                with open(sidecar) as f:
+                    prompt = f.read().strip()
+            items.append({"id": stem, "image": os.path.join(source, name), "prompt": prompt})
+    elif source.endswith(".csv"):
+        with open(source, newline="") as f:
+            items = [dict(row) for row in csv.DictReader(f)]
+    else:
+        with open(source) as f:
+            items = [json.loads(line) for line in f if line.strip()]
+
+    base = os.path.dirname(os.path.abspath(source)) if not os.path.isdir(source) else None
+    for index, item in enumerate(items):
+        # The id names the output directory: non-empty string, no path components
+        item_id = os.path.basename(str(item.get("id") or "").strip())
+        item["id"] = item_id if item_id not in ("", ".", "..") else f"item-{index:06d}"
+        item["prompt"] = item.get("prompt") or default_prompt
+        item["points"] = int(item.get("points") or default_points)
+        item["reference_height_cm"] = float(item["reference_height_cm"]) if item.get("reference_height_cm") else None
+        if item.get("image") and base and not os.path.isabs(item["image"]):
+            item["image"] = os.path.join(base, item["image"])
+    return items
+
+
+def read_manifest(out_dir):
+    """Last recorded status per item id (the manifest is append-only)."""
+    path = os.path.join(out_dir, MANIFEST)
+    status = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from an interrupted run
+                status[record["id"]] = record
+    return status
+
+
+class Manifest:
+    def __init__(self, out_dir):
+        self.file = open(os.path.join(out_dir, MANIFEST), "a")
+
+    def record(self, item_id, status, **fields):
+        self.file.write(json.dumps(dict(id=item_id, status=status, time=time.time(), **fields)) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def decode_item(item, foreground_ratio):
+    """Stage 1 (thread pool): load the image, remove the background and crop."""
+    start = time.perf_counter()
+    image = None
+    if item.get("image"):
+        from PIL import Image
+        from spar3d.utils import foreground_crop, remove_background
+
+        image = Image.open(item["image"]).convert("RGBA")
+        image = remove_background(image, _remover())
+        image = foreground_crop(image, foreground_ratio)
+    return item, image, time.perf_counter() - start
+
+
+_remover_local = threading.local()
+
+
+def _remover():
+    # transparent-background's Remover is not thread-safe; one per decode thread
+    if not hasattr(_remover_local, "remover"):
+        from transparent_background import Remover
+
+        _remover_local.remover = Remover()
+    return _remover_local.remover
+
+
+def export_item(item_id, arrays, out_dir, tiers, reference_height_cm=None):
+    """Stage 3 (process pool): build the GLB, take body measurements and compress textures."""
+    from body_measurements import MEASUREMENTS_FILE, measure_mesh
+    from glb_writer import build_glb
+    import texture_tiers
+
+    start = time.perf_counter()
+    item_dir = os.path.join(out_dir, item_id)
+    os.makedirs(item_dir, exist_ok=True)
+    glb = build_glb(**arrays)
+    path = os.path.join(item_dir, "model.glb")
+    with open(path, "wb") as f:
+        f.write(glb)
+    measurements = measure_mesh(arrays["positions"], arrays["indices"], reference_height_cm)
+    with open(os.path.join(item_dir, MEASUREMENTS_FILE), "w") as f:
+        json.dump(measurements, f)
+    result = {"path": path, "bytes": len(glb), "measurements": measurements}
+    if tiers:
+        report = texture_tiers.transcode_asset(glb, item_dir, tiers)
+        result["saved_bytes"] = {tier: stats["saved_bytes"] for tier, stats in report.items()}
+    result["export_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def infer(server, item, image, bake_resolution):
+    """Stage 2 (accelerator): image-to-3D via run_image, text-to-3D via the server stages."""
+    import torch
+    from spar3d_compile import bucket_points
+
+    if "seed" in item and item["seed"] not in (None, ""):
+        torch.manual_seed(int(item["seed"]))
+    if image is not None:
+        with torch.no_grad():
+            with torch.autocast(device_type=server.device, dtype=torch.float16):
+                mesh, _ = server.model.run_image(
+                    [image],
+                    bake_resolution=bake_resolution,
+                    remesh="none",
+                    vertex_count=-1,
+                    return_points=False,
+                )
+        return mesh[0] if isinstance(mesh, list) else mesh
+    # Compiled mode only has graphs for the warmed buckets, as in /inference
+    num_points = bucket_points(item["points"]) if server.compiled else item["points"]
+    points = server.sample_stage(item["prompt"], num_points)
+    return server.reconstruct_stage(points, bake_resolution)
+
+
+def run(args):
+    os.makedirs(args.out, exist_ok=True)
+    items = load_items(args.source, args.prompt, args.points)
+    done = {k for k, v in read_manifest(args.out).items() if v["status"] == "done"}
+    todo = [item for item in items if item["id"] not in done]
+    print(f"{len(items)} items, {len(items) - len(todo)} already done, {len(todo)} to go")
+    if not todo:
+        return
+
+    # Load the model exactly as the REST container does, but in the foreground
+    try:
+        import serve_rest as server
+    except ImportError:
+        import modified_serve_rest as server
+    if not server.load_runtime():
+        raise SystemExit(f"Model failed to load: {server.startup['error']}")
+    from glb_writer import mesh_arrays
+
+    tiers = [t for t in (args.texture_tiers or "").split(",") if t]
+    manifest = Manifest(args.out)
+    decoded = queue.Queue(maxsize=args.queue_size)
+    decode_pool = ThreadPoolExecutor(max_workers=args.decode_workers)
+    # spawn: forked children must not inherit the CUDA context
+    export_pool = ProcessPoolExecutor(
+        max_workers=args.export_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+    def feed():
+        # put() blocks once queue_size items are decoded ahead of the accelerator
+        for item in todo:
+            decoded.put((item, decode_pool.submit(decode_item, item, args.foreground_ratio)))
+        decoded.put(None)
+
+    threading.Thread(target=feed, daemon=True).start()
+
+    exporting = {}
+    completed = failed = 0
+    started = time.perf_counter()
+
+    def collect(block):
+        nonlocal completed, failed
+        if not exporting:
+            return
+        finished, _ = wait(list(exporting), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in finished:
+            item_id, timings = exporting.pop(future)
+            try:
+                manifest.record(item_id, "done", **timings, **future.result())
+                completed += 1
+            except Exception as e:
+                manifest.record(item_id, "failed", stage="export", error=str(e))
+                failed += 1
+        elapsed = time.perf_counter() - started
+        rate = completed / elapsed * 3600 if elapsed else 0.0
+        print(f"[{completed + failed}/{len(todo)}] {rate:.0f} items/hour, {failed} failed", end="\r")
+
+    try:
+        while True:
+            entry = decoded.get()
+            if entry is None:
+                break
+            item, future = entry
+            try:
+                _, image, decode_s = future.result()
+            except Exception as e:
+                failed += 1
+                manifest.record(item["id"], "failed", stage="decode", error=str(e))
+                continue
+            manifest.record(item["id"], "started")
+            infer_start = time.perf_counter()
+            try:
+                mesh = infer(server, item, image, args.bake_resolution)
+            except Exception as e:
+                failed += 1
+                manifest.record(item["id"], "failed", stage="inference", error=str(e))
+                continue
+            timings = {"decode_s": round(decode_s, 3), "infer_s": round(time.perf_counter() - infer_start, 3)}
+            exporting[export_pool.submit(export_item, item["id"], mesh_arrays(mesh), args.out, tiers, item["reference_height_cm"])] = (
+                item["id"],
+                timings,
+            )
+            # Bounded export queue: wait for a slot before taking the next item
+            collect(block=len(exporting) >= args.queue_size)
+        while exporting:
+            collect(block=True)
+    finally:
+        decode_pool.shutdown(wait=False, cancel_futures=True)
+        export_pool.shutdown(wait=True)
+        manifest.close()
+
+    elapsed = time.perf_counter() - started
+    print()
+    print(
+        f"Finished {completed} items ({failed} failed) in {elapsed / 60:.1f} min: "
+        f"{completed / elapsed * 3600 if elapsed else 0:.0f} items/hour"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline SPAR3D catalogue generation")
+    parser.add_argument("source", help="Directory of images, or a .jsonl / .csv manifest")
+    parser.add_argument("--out", default="/app/data/catalogue", help="Output directory (also holds the resume manifest)")
+    parser.add_argument("--prompt", default="", help="Prompt for items that do not set one")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--bake-resolution", type=int, default=1024)
+    parser.add_argument("--foreground-ratio", type=float, default=1.3)
+    parser.add_argument("--decode-workers", type=int, default=4)
+    parser.add_argument("--export-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--queue-size", type=int, default=4, help="Items buffered between stages")
+    parser.add_argument("--texture-tiers", default="", help="e.g. standard,draft (see texture_tiers.py)")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark glb_writer.mesh_to_glb against trimesh's mesh.export.
+
+Builds textured grid meshes of 20k-500k vertices (SPAR3D-like: UVs, cached
+normals, 1024x1024 base colour texture) and reports export time and peak
+Python-tracked memory for both paths. The mesh.export path includes reading the
+file back, as serve_rest did before sending it.
+
+Usage:  python bench_glb_writer.py [--sizes 20000,100000,500000] [--repeat 3]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import trimesh
+from PIL import Image
+
+from glb_writer import mesh_to_glb
+
+
+def make_mesh(vertex_count, texture_size=1024):
+    side = max(2, int(np.sqrt(vertex_count)))
+    u, v = np.meshgrid(np.linspace(0, 1, side), np.linspace(0, 1, side))
+    uv = np.column_stack([u.ravel(), v.ravel()])
+    vertices = np.column_stack([uv, 0.1 * np.sin(6 * uv[:, 0]) * np.cos(6 * uv[:, 1])])
+
+    idx = np.arange(side * side).reshape(side, side)
+    a, b = idx[:-1, :-1].ravel(), idx[:-1, 1:].ravel()
+    c, d = idx[1:, :-1].ravel(), idx[1:, 1:].ravel()
+    faces = np.concatenate([np.column_stack([a, b, d]), np.column_stack([a, d, c])])
+
+    rng = np.random.default_rng(0)
+    texture = Image.fromarray(rng.integers(0, 255, (texture_size, texture_size, 3), dtype=np.uint8))
+    material = trimesh.visual.material.PBRMaterial(
+        baseColorTexture=texture, metallicFactor=0.0, roughnessFactor=0.9
+    )
+    mesh = trimesh.Trimesh(
+        vertices=vertices,
+        faces=faces,
+        visual=trimesh.visual.TextureVisuals(uv=uv, material=material),
+        process=False,
+    )
+    mesh.vertex_normals  # SPAR3D meshes arrive with normals cached
+    return mesh
+
+
+def export_via_trimesh(mesh, out_dir):
+    path = os.path.join(out_dir, "model.glb")
+    mesh.export(path, include_normals=True)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def measure(fn, repeat):
+    times = []
+    peak = 0
+    size = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = len(fn())
+        times.append((time.perf_counter() - start) * 1000.0)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(times), peak / 2**20, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="20000,50000,100000,250000,500000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'vertices':>9} | {'export ms':>9} {'peak MB':>8} | {'writer ms':>9} {'peak MB':>8} | {'speedup':>7} {'size':>10}")
+    with tempfile.TemporaryDirectory() as out_dir:
+        for count in (int(s) for s in args.sizes.split(",")):
+            mesh = make_mesh(count)
+            base_ms, base_mb, _ = measure(lambda: export_via_trimesh(mesh, out_dir), args.repeat)
+            fast_ms, fast_mb, size = measure(lambda: mesh_to_glb(mesh), args.repeat)
+            print(
+                f"{len(mesh.vertices):>9} | {base_ms:>9.1f} {base_mb:>8.1f} | "
+                f"{fast_ms:>9.1f} {fast_mb:>8.1f} | {base_ms / fast_ms:>6.1f}x {size:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Body measurements from a reconstructed SPAR3D mesh, vectorized with NumPy.
+
+Height comes from the bounding box along the up axis. Chest, waist and hip are
+the convex-hull perimeters of horizontal cross-sections at fixed fractions of
+stature. Each cross-section is split into its outlines (torso, arms), and the
+outline around the body axis is measured.
+
+SPAR3D reconstructs from a single image at a normalized scale, so the mesh has
+no metric size. Centimetres are only reported when a reference height is
+given; the circumference-to-height ratios are always reported. The cm keys
+match `GeneratorResult.measurements` in app/api/generate/route.ts.
+"""
+
+import numpy as np
+
+# Fraction of stature above the floor (ISO 8559-style body proportions)
+SECTION_HEIGHTS = {"chestCm": 0.72, "waistCm": 0.61, "hipCm": 0.52}
+# glTF and SPAR3D output are Y-up
+UP_AXIS = 1
+MEASUREMENTS_FILE = "measurements.json"
+
+
+def slice_segments(vertices, faces, axis, level, corner_heights=None):
+    """
+    Intersect the mesh with the plane vertices[:, axis] == level.
+
+    corner_heights, if given, is vertices[faces, axis] for the passed faces,
+    so a caller slicing several levels gathers it once (and can pass only
+    the faces that may cross a level).
+
+    Returns (points, edge_keys): an (S, 2, 2) array of in-plane segment end
+    points and an (S, 2) array of the mesh edges they lie on, which identifies
+    shared end points between neighbouring faces.
+    """
+    if corner_heights is None:
+        corner_heights = vertices[:, axis][faces]
+    tri_h = corner_heights - level
+    crossing = (tri_h.min(axis=1) < 0) & (tri_h.max(axis=1) > 0)
+    tris = faces[crossing]
+    tri_h = tri_h[crossing]
+    if len(tris) == 0:
+        return np.empty((0, 2, 2)), np.empty((0, 2), dtype=np.int64)
+
+    # Edges (0,1), (1,2), (2,0) of every crossing triangle; exactly two change sign
+    a = tris
+    b = np.roll(tris, -1, axis=1)
+    ha = tri_h
+    hb = np.roll(tri_h, -1, axis=1)
+    cuts = (ha < 0) != (hb < 0)
+    # Drop the rare triangles touching the plane at a vertex (not exactly two cuts)
+    valid = cuts.sum(axis=1) == 2
+    a, b, ha, hb, cuts = a[valid], b[valid], ha[valid], hb[valid], cuts[valid]
+
+    ea, eb = a[cuts].reshape(-1, 2), b[cuts].reshape(-1, 2)
+    t = (ha[cuts] / (ha[cuts] - hb[cuts])).reshape(-1, 2, 1)
+    plane_axes = [i for i in range(3) if i != axis]
+    pa = vertices[ea][..., plane_axes]
+    pb = vertices[eb][..., plane_axes]
+    points = pa + t * (pb - pa)
+
+    lo, hi = np.minimum(ea, eb), np.maximum(ea, eb)
+    edge_keys = lo.astype(np.int64) * len(vertices) + hi
+    return points, edge_keys
+
+
+def outline_labels(edge_keys):
+    """Connected-component label per segment, joining segments that share a mesh edge."""
+    unique, inverse = np.unique(edge_keys, return_inverse=True)
+    inverse = inverse.reshape(-1, 2)
+    labels = np.arange(len(unique))
+    # Label propagation with pointer jumping; converges in O(log loop length) rounds
+    while True:
+        low = np.minimum(labels[inverse[:, 0]], labels[inverse[:, 1]])
+        updated = labels.copy()
+        np.minimum.at(updated, inverse[:, 0], low)
+        np.minimum.at(updated, inverse[:, 1], low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    return labels[inverse[:, 0]]
+
+
+def convex_hull(points):
+    """Andrew's monotone chain; returns hull vertices in counter-clockwise order."""
+    # Plain tuples: the chain walk is sequential and faster without NumPy scalars
+    pts = [tuple(p) for p in np.unique(points, axis=0).tolist()]
+    if len(pts) < 3:
+        return np.array(pts)
+
+    def half(seq):
+        hull = []
+        for p in seq:
+            while len(hull) >= 2:
+                (x1, y1), (x2, y2) = hull[-2], hull[-1]
+                if (x2 - x1) * (p[1] - y1) - (y2 - y1) * (p[0] - x1) > 0:
+                    break
+                hull.pop()
+            hull.append(p)
+        return hull
+
+    lower = half(pts)
+    upper = half(pts[::-1])
+    return np.array(lower[:-1] + upper[:-1])
+
+
+def perimeter(hull):
+    if len(hull) < 2:
+        return 0.0
+    return float(np.linalg.norm(hull - np.roll(hull, -1, axis=0), axis=1).sum())
+
+
+def _contains(hull, point):
+    if len(hull) < 3:
+        return False
+    edges = np.roll(hull, -1, axis=0) - hull
+    rel = point - hull
+    return bool(np.all(edges[:, 0] * rel[:, 1] - edges[:, 1] * rel[:, 0] >= 0))
+
+
+def section_circumference(vertices, faces, axis, level, body_axis=None, corner_heights=None):
+    """
+    Convex perimeter of the cross-section outline around body_axis (mesh units).
+
+    Without body_axis the centre of the section's bounding box is used.
+    """
+    points, edge_keys = slice_segments(vertices, faces, axis, level, corner_heights)
+    if len(points) == 0:
+        return 0.0
+    if body_axis is None:
+        flat = points.reshape(-1, 2)
+        body_axis = (flat.min(axis=0) + flat.max(axis=0)) / 2.0
+    labels = outline_labels(edge_keys)
+    best = None
+    for label in np.unique(labels):
+        hull = convex_hull(points[labels == label].reshape(-1, 2))
+        if _contains(hull, body_axis):
+            return perimeter(hull)
+        # Fall back to the largest outline when none encloses the axis (open meshes)
+        length = perimeter(hull)
+        if best is None or length > best:
+            best = length
+    return best
+
+
+def measure_mesh(vertices, faces, reference_height_cm=None, axis=UP_AXIS):
+    """
+    Height and chest / waist / hip circumferences.
+
+    With reference_height_cm the mesh is scaled so its height matches it and
+    the *Cm values are filled in; without it they are None. `ratios` (each
+    circumference divided by height) is scale-free and always present.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    heights = np.ascontiguousarray(vertices[:, axis])
+    floor = heights.min()
+    height = heights.max() - floor
+    if height <= 0:
+        return None
+    cm_per_unit = reference_height_cm / height if reference_height_cm else None
+
+    levels = {key: floor + fraction * height for key, fraction in SECTION_HEIGHTS.items()}
+    # Bin vertices between the section levels: only faces whose corners land in
+    # different bins can cross a level, so slicing runs on a few hundred faces
+    # instead of gathering float heights for the whole mesh once per level
+    bins = np.searchsorted(np.sort(list(levels.values())), heights).astype(np.int8)
+    b0, b1, b2 = bins[faces].T
+    candidates = faces[(b0 != b1) | (b1 != b2)]
+    corner_heights = heights[candidates]
+    result = {"heightCm": round(height * cm_per_unit, 1) if cm_per_unit else None, "ratios": {}}
+    for key, level in levels.items():
+        length = section_circumference(vertices, candidates, axis, level, corner_heights=corner_heights)
+        result[key] = round(length * cm_per_unit, 1) if cm_per_unit else None
+        result["ratios"][key[: -len("Cm")]] = round(length / height, 4)
+    return result
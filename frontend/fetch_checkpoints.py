@@ -0,0 +1,329 @@
+"""
+Integrity-verified, resumable fetch of the SPAR3D checkpoint into a shared
+per-node mirror.
+
+Files listed in a manifest ({"files": {path: {"sha256", "size"}}}) are
+downloaded in parallel HTTP range chunks. Finished chunks are recorded next to
+the partial file, so an interrupted download resumes. The result is verified
+against its SHA-256 before it is moved into the mirror directory. A lock per
+file makes containers that share the mirror volume wait for one download
+instead of starting their own.
+
+Sources: the Hugging Face hub (default, HF_TOKEN for the gated repo), any HTTP
+mirror that serves the same relative paths, or a local directory for
+air-gapped nodes. `--serve` runs a small range-capable HTTP mirror for
+testing or for serving a node's mirror to its neighbours.
+
+  python fetch_checkpoints.py --manifest-from-hub stabilityai/stable-point-aware-3d > model_manifest.json
+  python fetch_checkpoints.py --manifest model_manifest.json --mirror /models/spar3d --link checkpoints
+  python fetch_checkpoints.py --manifest model_manifest.json --source http://10.0.0.5:8088
+  python fetch_checkpoints.py --serve /models/spar3d --port 8088
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+HF_URL = "https://huggingface.co/{repo}/resolve/{revision}/{path}"
+DEFAULT_REPO = "stabilityai/stable-point-aware-3d"
+DEFAULT_MIRROR = os.environ.get("SPAR3D_MODEL_MIRROR", "/models/spar3d")
+CHUNK_SIZE = 64 * 2**20
+HASH_BLOCK = 8 * 2**20
+
+
+class IntegrityError(Exception):
+    """Raised when a downloaded file does not match its manifest SHA-256."""
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_url(source, manifest, path):
+    if source == "hf":
+        return HF_URL.format(
+            repo=manifest.get("repo", DEFAULT_REPO), revision=manifest.get("revision", "main"), path=path
+        )
+    return f"{source.rstrip('/')}/{path}"
+
+
+class StripAuthRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """
+    Drop Authorization when a redirect leaves the original host.
+
+    The hub answers /resolve with a redirect to its LFS CDN; urllib would
+    otherwise forward the HF token there, and signed-URL backends reject a
+    request that carries both a signature and a bearer token.
+    """
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        new = super().redirect_request(req, fp, code, msg, headers, newurl)
+        if new is not None and urllib.parse.urlsplit(newurl).hostname != urllib.parse.urlsplit(req.full_url).hostname:
+            new.remove_header("Authorization")
+        return new
+
+
+_opener = urllib.request.build_opener(StripAuthRedirectHandler)
+
+
+def _request(url, start=None, end=None):
+    request = urllib.request.Request(url)
+    token = os.environ.get("HF_TOKEN")
+    if token and "huggingface.co" in url:
+        request.add_header("Authorization", f"Bearer {token}")
+    if start is not None:
+        request.add_header("Range", f"bytes={start}-{end}")
+    return _opener.open(request, timeout=60)
+
+
+class ChunkState:
+    """Completed chunk indices for a .part file, persisted after every chunk."""
+
+    def __init__(self, path, size, chunk_size):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get("size") == size and state.get("chunk_size") == chunk_size:
+                self.done = set(state["done"])
+        self.size = size
+        self.chunk_size = chunk_size
+
+    def mark(self, index):
+        with self.lock:
+            self.done.add(index)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"size": self.size, "chunk_size": self.chunk_size, "done": sorted(self.done)}, f)
+            os.replace(tmp, self.path)
+
+
+def download(url, dest, size, workers=8, chunk_size=CHUNK_SIZE):
+    """Ranged parallel download of url into dest.part, resuming finished chunks."""
+    part = dest + ".part"
+    state = ChunkState(part + ".json", size, chunk_size)
+    if not os.path.exists(part):
+        state.done.clear()
+    with open(part, "ab") as f:
+        f.truncate(size)
+
+    chunks = [i for i in range((size + chunk_size - 1) // chunk_size) if i not in state.done]
+    if state.done:
+        print(f"  resuming {os.path.basename(dest)}: {len(state.done)} chunks already present")
+    fd = os.open(part, os.O_WRONLY)
+    progress = {"bytes": 0, "started": time.perf_counter()}
+
+    def fetch(index):
+        start = index * chunk_size
+        end = min(size, start + chunk_size) - 1
+        with _request(url, start, end) as response:
+            if response.status != 206 and size > chunk_size:
+                raise IOError(f"{url} does not support range requests")
+            offset = start
+            while True:
+                block = response.read(2**20)
+                if not block:
+                    break
+                os.pwrite(fd, block, offset)
+                offset += len(block)
+        if offset != end + 1:
+            raise IOError(f"Short read for chunk {index} of {url}")
+        state.mark(index)
+        with state.lock:
+            progress["bytes"] += end + 1 - start
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(fetch, chunks):
+                pass
+    finally:
+        os.close(fd)
+    elapsed = time.perf_counter() - progress["started"]
+    if elapsed > 0 and progress["bytes"]:
+        print(f"  {progress['bytes'] / 2**20:.0f} MiB in {elapsed:.1f} s ({progress['bytes'] / 2**20 / elapsed:.0f} MiB/s)")
+    return part
+
+
+def fetch_file(path, entry, manifest, source, mirror, workers, chunk_size):
+    """Make mirror/path present and verified; returns its local path."""
+    dest = os.path.join(mirror, path)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    expected = entry.get("sha256")
+    marker = dest + ".sha256"
+
+    # One download per node: other containers on the same mirror wait here
+    with open(dest + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(dest) and os.path.exists(marker):
+            with open(marker) as f:
+                if not expected or f.read().strip() == expected:
+                    return dest
+
+        if source != "hf" and os.path.isdir(source):
+            # Air-gapped: copy from a local directory / mounted share
+            tmp = dest + ".part"
+            shutil.copyfile(os.path.join(source, path), tmp)
+        else:
+            size = entry.get("size")
+            url = source_url(source, manifest, path)
+            if size is None:
+                with _request(url) as response:
+                    size = int(response.headers["Content-Length"])
+            print(f"Fetching {path} ({size / 2**20:.0f} MiB) from {url}")
+            tmp = download(url, dest, size, workers=workers, chunk_size=chunk_size)
+
+        actual = sha256_file(tmp)
+        if expected and actual != expected:
+            os.remove(tmp)
+            if os.path.exists(tmp + ".json"):
+                os.remove(tmp + ".json")
+            raise IntegrityError(f"{path}: sha256 {actual} does not match manifest {expected}")
+        if not expected:
+            print(f"  {path}: no sha256 in manifest, recorded {actual}")
+        os.replace(tmp, dest)
+        if os.path.exists(tmp + ".json"):
+            os.remove(tmp + ".json")
+        with open(marker, "w") as f:
+            f.write(actual)
+    return dest
+
+
+def ensure_files(manifest, source="hf", mirror=DEFAULT_MIRROR, link=None, workers=8, chunk_size=CHUNK_SIZE):
+    """Fetch every manifest file into the mirror and optionally symlink them under link."""
+    paths = {}
+    for path, entry in manifest["files"].items():
+        paths[path] = fetch_file(path, entry, manifest, source, mirror, workers, chunk_size)
+    if link:
+        for path, local in paths.items():
+            # serve_rest expects checkpoints/<file>, so link by file name
+            target = os.path.join(link, os.path.basename(path))
+            os.makedirs(link, exist_ok=True)
+            if os.path.islink(target) or os.path.exists(target):
+                if os.path.realpath(target) == os.path.realpath(local):
+                    continue
+                os.remove(target)
+            os.symlink(os.path.abspath(local), target)
+    return paths
+
+
+def manifest_from_hub(repo, revision="main", patterns=("config.yaml", "model.safetensors")):
+    """Manifest with sizes and LFS SHA-256s from the hub's file metadata."""
+    from huggingface_hub import HfApi
+
+    info = HfApi().model_info(repo, revision=revision, files_metadata=True)
+    files = {}
+    for sibling in info.siblings:
+        if not any(sibling.rfilename.endswith(p) for p in patterns):
+            continue
+        lfs = getattr(sibling, "lfs", None)
+        sha = (lfs.get("sha256") if isinstance(lfs, dict) else getattr(lfs, "sha256", None)) if lfs else None
+        files[sibling.rfilename] = {"size": sibling.size, "sha256": sha}
+    return {"repo": repo, "revision": info.sha or revision, "files": files}
+
+
+def manifest_from_dir(directory):
+    """Manifest of an existing, trusted local copy (e.g. from the current container image)."""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            full = os.path.join(root, name)
+            rel = os.path.relpath(full, directory)
+            files[rel] = {"size": os.path.getsize(full), "sha256": sha256_file(full)}
+    return {"files": files}
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler plus single-range `Range: bytes=a-b` support."""
+
+    def send_head(self):
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        path = self.translate_path(self.path)
+        if not match or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+        if start > end:
+            self.send_error(416, "Requested Range Not Satisfiable")
+            return None
+        f = open(path, "rb")
+        f.seek(start)
+        self.send_response(206)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, "_remaining", None)
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining > 0:
+            block = source.read(min(2**20, remaining))
+            if not block:
+                break
+            outputfile.write(block)
+            remaining -= len(block)
+        self._remaining = None
+
+
+def serve(directory, port):
+    handler = lambda *a, **kw: RangeRequestHandler(*a, directory=directory, **kw)  # noqa: E731
+    print(f"Serving {directory} with range support on :{port}")
+    ThreadingHTTPServer(("0.0.0.0", port), handler).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable, verified SPAR3D checkpoint fetcher")
+    parser.add_argument("--manifest", default=os.environ.get("SPAR3D_MODEL_MANIFEST", "model_manifest.json"))
+    parser.add_argument("--source", default=os.environ.get("SPAR3D_MODEL_SOURCE", "hf"),
+                        help="'hf', an HTTP mirror base URL, or a local directory")
+    parser.add_argument("--mirror", default=DEFAULT_MIRROR, help="Shared per-node mirror directory")
+    parser.add_argument("--link", help="Symlink the fetched files into this directory (e.g. checkpoints)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_SIZE // 2**20)
+    parser.add_argument("--manifest-from-hub", metavar="REPO", help="Print a manifest built from hub metadata")
+    parser.add_argument("--manifest-from-dir", metavar="DIR", help="Print a manifest hashing a local copy")
+    parser.add_argument("--serve", metavar="DIR", help="Serve DIR as a range-capable HTTP mirror")
+    parser.add_argument("--port", type=int, default=8088)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+    elif args.manifest_from_hub:
+        json.dump(manifest_from_hub(args.manifest_from_hub), sys.stdout, indent=2)
+    elif args.manifest_from_dir:
+        json.dump(manifest_from_dir(args.manifest_from_dir), sys.stdout, indent=2)
+    else:
+        with open(args.manifest) as f:
+            manifest = json.load(f)
+        try:
+            ensure_files(manifest, args.source, args.mirror, args.link, args.workers, args.chunk_mb * 2**20)
+        except (IntegrityError, urllib.error.URLError, IOError) as e:
+            raise SystemExit(f"Checkpoint fetch failed: {e}")
+        print("Checkpoint files present and verified")
+
+
+if __name__ == "__main__":
+    main()
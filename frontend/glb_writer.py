@@ -0,0 +1,245 @@
+"""
+Direct-from-buffer GLB writer for SPAR3D meshes.
+
+Replaces `mesh.export(path, include_normals=True)` on the hot path: the binary
+chunk is assembled from the vertex, normal, UV, index and texture arrays into
+one pre-sized bytearray with memoryview slices, without going through the
+generic exporter or a temporary file.
+"""
+
+import io
+import json
+import struct
+
+import numpy as np
+
+GLB_MAGIC = 0x46546C67  # "glTF"
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+FLOAT = 5126
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+
+
+def pad4(n):
+    """Round n up to the 4-byte alignment glTF requires for chunks and views."""
+    return (n + 3) & ~3
+
+
+def encode_image(image, format="PNG"):
+    """Encode a PIL image to bytes; bytes are passed through unchanged."""
+    if image is None or isinstance(image, (bytes, bytearray, memoryview)):
+        return image
+    out = io.BytesIO()
+    image.save(out, format=format)
+    return out.getvalue()
+
+
+def mesh_arrays(mesh):
+    """Pull the arrays the writer needs out of a trimesh mesh produced by SPAR3D."""
+    arrays = {
+        "positions": mesh.vertices,
+        # vertex_normals is cached on SPAR3D meshes, so this does not recompute
+        "normals": mesh.vertex_normals,
+        "indices": mesh.faces,
+        "uvs": None,
+        "base_color": None,
+        "normal_map": None,
+        "metallic_roughness": None,
+        "metallic": 0.0,
+        "roughness": 1.0,
+    }
+    visual = getattr(mesh, "visual", None)
+    uv = getattr(visual, "uv", None)
+    if uv is not None and len(uv) == len(mesh.vertices):
+        arrays["uvs"] = uv
+    material = getattr(visual, "material", None)
+    if material is not None:
+        arrays["base_color"] = getattr(material, "baseColorTexture", None)
+        arrays["normal_map"] = getattr(material, "normalTexture", None)
+        arrays["metallic_roughness"] = getattr(material, "metallicRoughnessTexture", None)
+        if getattr(material, "metallicFactor", None) is not None:
+            arrays["metallic"] = float(material.metallicFactor)
+        if getattr(material, "roughnessFactor", None) is not None:
+            arrays["roughness"] = float(material.roughnessFactor)
+    return arrays
+
+
+def build_glb(
+    positions,
+    indices,
+    normals=None,
+    uvs=None,
+    base_color=None,
+    normal_map=None,
+    metallic_roughness=None,
+    metallic=0.0,
+    roughness=1.0,
+):
+    """
+    Assemble a GLB from raw arrays and return it as a bytearray.
+
+    Images may be PIL images or already-encoded PNG/JPEG bytes.
+    """
+    positions = np.ascontiguousarray(positions, dtype=np.float32)
+    index_dtype = np.uint16 if len(positions) < 65536 else np.uint32
+    indices = np.ascontiguousarray(indices, dtype=index_dtype).reshape(-1)
+
+    # (name, array, accessor type)
+    attributes = [("POSITION", positions, "VEC3")]
+    if normals is not None:
+        attributes.append(("NORMAL", np.ascontiguousarray(normals, dtype=np.float32), "VEC3"))
+    if uvs is not None:
+        uvs = np.asarray(uvs, dtype=np.float32)
+        # glTF puts the UV origin top-left, trimesh bottom-left
+        flipped = np.empty_like(uvs)
+        flipped[:, 0] = uvs[:, 0]
+        np.subtract(1.0, uvs[:, 1], out=flipped[:, 1])
+        attributes.append(("TEXCOORD_0", flipped, "VEC2"))
+
+    images = []
+    for key, image in (
+        ("baseColorTexture", base_color),
+        ("normalTexture", normal_map),
+        ("metallicRoughnessTexture", metallic_roughness),
+    ):
+        data = encode_image(image)
+        if data is not None:
+            mime = "image/jpeg" if bytes(data[:2]) == b"\xff\xd8" else "image/png"
+            images.append((key, data, mime))
+
+    # Lay out the binary chunk: every view starts on a 4-byte boundary
+    views = []
+    offset = 0
+    for _, array, _ in attributes:
+        views.append((offset, array.nbytes, ARRAY_BUFFER))
+        offset = pad4(offset + array.nbytes)
+    index_view = len(views)
+    views.append((offset, indices.nbytes, ELEMENT_ARRAY_BUFFER))
+    offset = pad4(offset + indices.nbytes)
+    image_views = []
+    for _, data, _ in images:
+        image_views.append(len(views))
+        views.append((offset, len(data), None))
+        offset = pad4(offset + len(data))
+    bin_length = offset
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "VFR spar3d glb_writer"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "buffers": [{"byteLength": bin_length}],
+        "bufferViews": [],
+        "accessors": [],
+    }
+    for view_offset, length, target in views:
+        view = {"buffer": 0, "byteOffset": view_offset, "byteLength": length}
+        if target is not None:
+            view["target"] = target
+        gltf["bufferViews"].append(view)
+
+    primitive = {"attributes": {}, "mode": 4}
+    for view_index, (name, array, kind) in enumerate(attributes):
+        accessor = {
+            "bufferView": view_index,
+            "componentType": FLOAT,
+            "count": len(array),
+            "type": kind,
+        }
+        if name == "POSITION":
+            accessor["min"] = positions.min(axis=0).tolist()
+            accessor["max"] = positions.max(axis=0).tolist()
+        primitive["attributes"][name] = len(gltf["accessors"])
+        gltf["accessors"].append(accessor)
+    primitive["indices"] = len(gltf["accessors"])
+    gltf["accessors"].append({
+        "bufferView": index_view,
+        "componentType": UNSIGNED_SHORT if index_dtype is np.uint16 else UNSIGNED_INT,
+        "count": len(indices),
+        "type": "SCALAR",
+    })
+
+    if images:
+        pbr = {"metallicFactor": metallic, "roughnessFactor": roughness}
+        material = {"pbrMetallicRoughness": pbr, "doubleSided": False}
+        gltf["images"] = []
+        gltf["textures"] = []
+        gltf["samplers"] = [{"magFilter": 9729, "minFilter": 9987}]
+        for texture_index, ((key, _, mime), view_index) in enumerate(zip(images, image_views)):
+            gltf["images"].append({"bufferView": view_index, "mimeType": mime})
+            gltf["textures"].append({"sampler": 0, "source": texture_index})
+            if key == "normalTexture":
+                material["normalTexture"] = {"index": texture_index}
+            else:
+                pbr[key] = {"index": texture_index}
+        gltf["materials"] = [material]
+        primitive["material"] = 0
+    gltf["meshes"] = [{"primitives": [primitive]}]
+
+    sources = [array for _, array, _ in attributes] + [indices] + [data for _, data, _ in images]
+    parts = [(view_offset, source) for (view_offset, _, _), source in zip(views, sources)]
+    return pack_glb(gltf, parts, bin_length)
+
+
+def pack_glb(gltf, parts, bin_length):
+    """
+    Serialize gltf plus its binary chunk into one bytearray.
+
+    parts is a list of (offset, buffer) pairs placed at offset within the BIN
+    chunk; anything supporting the buffer protocol (ndarray, bytes) works.
+    """
+    json_bytes = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_length = pad4(len(json_bytes))
+    total = 12 + 8 + json_length + 8 + bin_length
+
+    # One allocation for the whole file; padding is already zero
+    out = bytearray(total)
+    view = memoryview(out)
+    struct.pack_into("<III", out, 0, GLB_MAGIC, 2, total)
+    struct.pack_into("<II", out, 12, json_length, CHUNK_JSON)
+    view[20:20 + len(json_bytes)] = json_bytes
+    view[20 + len(json_bytes):20 + json_length] = b" " * (json_length - len(json_bytes))
+    bin_start = 20 + json_length + 8
+    struct.pack_into("<II", out, bin_start - 8, bin_length, CHUNK_BIN)
+
+    for offset, source in parts:
+        data = memoryview(source).cast("B")
+        start = bin_start + offset
+        view[start:start + len(data)] = data
+    return out
+
+
+def parse_glb(data):
+    """Split a GLB into its glTF JSON dict and a memoryview of the BIN chunk."""
+    view = memoryview(data)
+    magic, version, _ = struct.unpack_from("<III", view, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise ValueError("Not a glTF 2.0 binary")
+    json_length, chunk_type = struct.unpack_from("<II", view, 12)
+    if chunk_type != CHUNK_JSON:
+        raise ValueError("GLB does not start with a JSON chunk")
+    gltf = json.loads(bytes(view[20:20 + json_length]))
+    bin_chunk = view[0:0]
+    offset = 20 + json_length
+    if offset + 8 <= len(view):
+        bin_length, chunk_type = struct.unpack_from("<II", view, offset)
+        if chunk_type == CHUNK_BIN:
+            bin_chunk = view[offset + 8:offset + 8 + bin_length]
+    return gltf, bin_chunk
+
+
+def mesh_to_glb(mesh):
+    """GLB bytearray for a trimesh mesh, equivalent to mesh.export(include_normals=True)."""
+    return build_glb(**mesh_arrays(mesh))
+
+
+def iter_chunks(buffer, chunk_size=1 << 20):
+    """Yield zero-copy memoryview slices of buffer for a streaming response."""
+    view = memoryview(buffer)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
@@ -0,0 +1,197 @@
+"""
+Priority classes and per-client fair queuing for SPAR3D generation jobs.
+
+Jobs carry a priority class (interactive, standard, batch) and a client key
+(API key or client header). Classes are served in strict priority order; within
+a class, clients are served round-robin so one bulk caller cannot starve the
+others. Lower-priority jobs call `checkpoint()` between pipeline stages and hand
+their slot over while higher-priority work is waiting.
+"""
+
+import asyncio
+import itertools
+import os
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+PRIORITIES = ("interactive", "standard", "batch")
+DEFAULT_PRIORITY = "standard"
+
+
+class QueueFull(Exception):
+    """Raised when a priority class already has its maximum number of waiting jobs."""
+
+
+def _parse_limits(raw, default):
+    limits = {p: default for p in PRIORITIES}
+    for item in filter(None, raw.split(",")):
+        name, _, value = item.partition("=")
+        if name.strip() in limits:
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class Ticket:
+    __slots__ = ("priority", "client", "seq", "future", "held", "yields", "wait_s")
+
+    def __init__(self, priority, client, seq):
+        self.priority = priority
+        self.client = client
+        self.seq = seq
+        self.future = None
+        self.held = False
+        self.yields = 0
+        self.wait_s = 0.0  # total time spent queued, including after yields
+
+
+class JobScheduler:
+    def __init__(self, max_active=None, class_limits=None, queue_limits=None):
+        self.max_active = max_active or int(os.environ.get("SPAR3D_MAX_ACTIVE", "1"))
+        self.class_limits = class_limits or _parse_limits(
+            os.environ.get("SPAR3D_CLASS_CONCURRENCY", ""), self.max_active
+        )
+        self.queue_limits = queue_limits or _parse_limits(
+            os.environ.get("SPAR3D_QUEUE_LIMIT", ""), 64
+        )
+        # priority -> client -> deque of waiting tickets; dict order is the round-robin order
+        self.waiting = {p: OrderedDict() for p in PRIORITIES}
+        self.waiting_count = {p: 0 for p in PRIORITIES}
+        self.active = {p: 0 for p in PRIORITIES}
+        self.completed = {p: 0 for p in PRIORITIES}
+        self.yields = 0
+        self._seq = itertools.count()
+
+    @staticmethod
+    def normalize(priority):
+        return priority if priority in PRIORITIES else DEFAULT_PRIORITY
+
+    def _can_run(self, priority):
+        return (
+            sum(self.active.values()) < self.max_active
+            and self.active[priority] < self.class_limits[priority]
+        )
+
+    def _enqueue(self, ticket, front=False):
+        queue = self.waiting[ticket.priority].setdefault(ticket.client, deque())
+        if front:
+            queue.appendleft(ticket)
+        else:
+            queue.append(ticket)
+        self.waiting_count[ticket.priority] += 1
+
+    def _pop(self, priority):
+        clients = self.waiting[priority]
+        client, queue = next(iter(clients.items()))
+        ticket = queue.popleft()
+        # Move the client to the back of the round-robin order
+        del clients[client]
+        if queue:
+            clients[client] = queue
+        self.waiting_count[priority] -= 1
+        return ticket
+
+    def _remove(self, ticket):
+        queue = self.waiting[ticket.priority].get(ticket.client)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            self.waiting_count[ticket.priority] -= 1
+            if not queue:
+                del self.waiting[ticket.priority][ticket.client]
+
+    def _dispatch(self):
+        for priority in PRIORITIES:
+            while self.waiting_count[priority] and self._can_run(priority):
+                ticket = self._pop(priority)
+                if ticket.future.done():
+                    # Cancelled while waiting; its own handler finds it already dequeued
+                    continue
+                self.active[priority] += 1
+                ticket.held = True
+                ticket.future.set_result(True)
+
+    async def _wait_turn(self, ticket, front=False):
+        loop = asyncio.get_running_loop()
+        ticket.future = loop.create_future()
+        self._enqueue(ticket, front=front)
+        self._dispatch()
+        started = loop.time()
+        try:
+            await ticket.future
+            ticket.wait_s += loop.time() - started
+        except asyncio.CancelledError:
+            # Client went away: give the slot back if it was already granted
+            if ticket.held:
+                self.release(ticket, finished=False)
+            else:
+                self._remove(ticket)
+            raise
+
+    async def acquire(self, priority, client):
+        priority = self.normalize(priority)
+        if self.waiting_count[priority] >= self.queue_limits[priority]:
+            raise QueueFull(f"Too many queued {priority} jobs")
+        ticket = Ticket(priority, client, next(self._seq))
+        await self._wait_turn(ticket)
+        return ticket
+
+    def release(self, ticket, finished=True):
+        if not ticket.held:
+            return
+        ticket.held = False
+        self.active[ticket.priority] -= 1
+        if finished:
+            self.completed[ticket.priority] += 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority, client):
+        ticket = await self.acquire(priority, client)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def should_yield(self, ticket):
+        """True when a higher-priority class has waiting jobs it has room to start."""
+        for priority in PRIORITIES:
+            if priority == ticket.priority:
+                return False
+            if self.waiting_count[priority] and self.active[priority] < self.class_limits[priority]:
+                return True
+        return False
+
+    async def checkpoint(self, ticket):
+        """Between pipeline stages: hand the slot over if higher-priority work waits."""
+        if not self.should_yield(ticket):
+            return
+        ticket.yields += 1
+        self.yields += 1
+        self.release(ticket, finished=False)
+        # Re-queue at the head of its own client queue so it keeps its place
+        await self._wait_turn(ticket, front=True)
+
+    def stats(self):
+        return {
+            "max_active": self.max_active,
+            "yields": self.yields,
+            "classes": {
+                p: {
+                    "active": self.active[p],
+                    "waiting": self.waiting_count[p],
+                    "waiting_clients": len(self.waiting[p]),
+                    "completed": self.completed[p],
+                    "concurrency": self.class_limits[p],
+                    "queue_limit": self.queue_limits[p],
+                }
+                for p in PRIORITIES
+            },
+        }
+
+
+def client_key(headers, fallback=""):
+    """Fair-queuing key: API key, then an explicit client id header, then the peer address."""
+    for name in ("x-api-key", "authorization", "x-client-id"):
+        value = headers.get(name)
+        if value:
+            return value
+    return fallback
@@ -0,0 +1,292 @@
+"""
+Open-loop load generator and SLO report for the SPAR3D HTTP API.
+
+Requests arrive as a Poisson process at the target rate whether or not earlier
+ones have finished, so queueing shows up as latency instead of being hidden by
+a closed loop. Each request is drawn from a weighted mix of /inference prompts
+and `points` values and /generate images. Alternatively a recorded request log
+is replayed with its original timing.
+
+For every offered load the report gives latency percentiles, throughput, error
+and 429 rates, server-side queueing delay (X-Queue-Wait-Ms) and the time spent
+draining in-flight requests after the arrival window. A sweep stops at the
+saturation point.
+
+  python load_generator.py --url http://localhost:3005 --rps 0.5,1,2,4 --duration 60
+  python load_generator.py --mix mix.json --rps 1 --duration 120 --report load.json
+  python load_generator.py --replay requests.jsonl --speed 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import httpx
+
+DEFAULT_MIX = {
+    "inference": {
+        "weight": 0.8,
+        "prompts": ["summer dress", "denim jacket", "low-poly robot", "wool coat", "sneakers"],
+        # [value, weight] pairs
+        "points": [[4096, 0.2], [8192, 0.3], [20000, 0.5]],
+        "priority": [["interactive", 0.3], ["standard", 0.5], ["batch", 0.2]],
+    },
+    "generate": {
+        "weight": 0.2,
+        "images": ["dummy_image.png"],
+        "prompts": [""],
+    },
+}
+
+
+def _weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+class Mix:
+    """Draws request specs ({endpoint, body | image, prompt, priority}) from a mix config."""
+
+    def __init__(self, config, base_dir, seed=None):
+        self.config = config
+        self.base_dir = base_dir
+        self.rng = random.Random(seed)
+        self.endpoints = [(name, spec["weight"]) for name, spec in config.items() if spec.get("weight", 0) > 0]
+        self._images = {}
+
+    def image(self, path):
+        if path not in self._images:
+            full = path if os.path.isabs(path) else os.path.join(self.base_dir, path)
+            with open(full, "rb") as f:
+                self._images[path] = (os.path.basename(path), f.read())
+        return self._images[path]
+
+    def draw(self):
+        endpoint = _weighted(self.rng, self.endpoints)
+        spec = self.config[endpoint]
+        priority = _weighted(self.rng, spec["priority"]) if spec.get("priority") else None
+        prompt = self.rng.choice(spec.get("prompts") or [""])
+        if endpoint == "inference":
+            body = {"prompt": prompt, "points": _weighted(self.rng, spec["points"])}
+            if priority:
+                body["priority"] = priority
+            return {"endpoint": "/inference", "body": body}
+        return {"endpoint": "/generate", "image": self.rng.choice(spec["images"]), "prompt": prompt, "priority": priority}
+
+
+def load_replay(path):
+    """Recorded log: one JSON object per line with `t` (seconds from start) and a request spec."""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r.get("t", 0.0))
+    return records
+
+
+async def send(client, url, spec, mix, results, started_at):
+    result = {"endpoint": spec["endpoint"], "sent": time.perf_counter() - started_at}
+    start = time.perf_counter()
+    try:
+        if spec["endpoint"] == "/inference":
+            response = await client.post(url + "/inference", json=spec["body"])
+        else:
+            name, data = mix.image(spec["image"])
+            headers = {"X-Priority": spec["priority"]} if spec.get("priority") else {}
+            response = await client.post(
+                url + "/generate",
+                files={"image": (name, data)},
+                data={"prompt": spec.get("prompt", "")},
+                headers=headers,
+            )
+        result["status"] = response.status_code
+        result["bytes"] = len(response.content)
+        if "x-queue-wait-ms" in response.headers:
+            result["queue_ms"] = float(response.headers["x-queue-wait-ms"])
+    except httpx.HTTPError as e:
+        result["status"] = 0
+        result["error"] = type(e).__name__
+    result["latency_ms"] = (time.perf_counter() - start) * 1000.0
+    results.append(result)
+
+
+async def run_open_loop(url, mix, rps, duration, max_outstanding, seed=None):
+    """
+    Poisson arrivals at rps for duration seconds.
+
+    Returns (results, client-side drops, drain seconds): the time after the
+    arrival window spent waiting for in-flight requests to finish.
+    """
+    rng = random.Random(seed)
+    results, tasks = [], set()
+    dropped = 0
+    limits = httpx.Limits(max_connections=max_outstanding, max_keepalive_connections=max_outstanding)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(900.0, connect=10.0), limits=limits) as client:
+        started_at = time.perf_counter()
+        next_at = 0.0
+        while True:
+            next_at += rng.expovariate(rps)
+            if next_at >= duration:
+                break
+            await asyncio.sleep(max(0.0, started_at + next_at - time.perf_counter()))
+            if len(tasks) >= max_outstanding:
+                # The generator itself would become the bottleneck; count it instead
+                dropped += 1
+                continue
+            task = asyncio.create_task(send(client, url, mix.draw(), mix, results, started_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        # Arrivals stop at duration even if the last gap ended early
+        window_end = started_at + duration
+        if tasks:
+            await asyncio.gather(*tasks)
+        drain = max(0.0, time.perf_counter() - window_end)
+    return results, dropped, drain
+
+
+async def run_replay(url, mix, records, speed, max_outstanding):
+    results, tasks = [], set()
+    limits = httpx.Limits(max_connections=max_outstanding, max_keepalive_connections=max_outstanding)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(900.0, connect=10.0), limits=limits) as client:
+        started_at = time.perf_counter()
+        for record in records:
+            await asyncio.sleep(max(0.0, started_at + record.get("t", 0.0) / speed - time.perf_counter()))
+            task = asyncio.create_task(send(client, url, record, mix, results, started_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    return results
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return round(ordered[index], 1)
+
+
+def summarize(results, offered_rps, duration, dropped=0, drain_s=0.0):
+    """
+    Throughput is the completion rate inside the arrival window, from the
+    first success to the end of the window. Completions during the drain are
+    left out, so a server with a growing backlog falls behind. Starting at
+    the first success keeps the pipeline fill time (one latency) from
+    counting against a server that keeps up.
+
+    arrival_rps is the rate at which the requests that could complete in that
+    span were actually sent: the same-length span starting at the first
+    success's send time. It is what throughput is compared against, since
+    Poisson arrivals stray from the nominal offered rate.
+    """
+    ok = [r for r in results if 200 <= r["status"] < 300]
+    finished = sorted((r["sent"] + r["latency_ms"] / 1000.0, r["sent"]) for r in ok)
+    in_window = [f for f in finished if f[0] <= duration]
+    throughput = arrival_rps = 0.0
+    if in_window and in_window[0][0] < duration:
+        first_done, first_sent = in_window[0]
+        span = duration - first_done
+        # The first success opens the span, so neither it nor its request is counted
+        throughput = round((len(in_window) - 1) / span, 3)
+        arrivals = sum(1 for r in results if first_sent < r["sent"] <= first_sent + span)
+        arrival_rps = round(arrivals / span, 3)
+    throttled = [r for r in results if r["status"] == 429]
+    errors = [r for r in results if r["status"] == 0 or r["status"] >= 500 or (400 <= r["status"] < 500 and r["status"] != 429)]
+    latencies = [r["latency_ms"] for r in ok]
+    queue = [r["queue_ms"] for r in ok if "queue_ms" in r]
+    total = len(results) or 1
+    return {
+        "offered_rps": offered_rps,
+        "sent": len(results),
+        "client_dropped": dropped,
+        "throughput_rps": throughput,
+        "arrival_rps": arrival_rps,
+        "completed_in_window": len(in_window),
+        "drain_s": round(drain_s, 1),
+        "error_rate": round(len(errors) / total, 4),
+        "throttle_rate": round(len(throttled) / total, 4),
+        "latency_ms": {f"p{q}": percentile(latencies, q) for q in (50, 90, 95, 99)},
+        "queue_ms": {"p50": percentile(queue, 50), "p95": percentile(queue, 95)},
+    }
+
+
+def saturated(summary, slo_ms, max_error_rate):
+    """Saturated once throughput falls behind the arrivals, p95 breaks the SLO, or errors climb."""
+    p95 = summary["latency_ms"]["p95"]
+    return (
+        summary["throughput_rps"] < 0.9 * (summary["arrival_rps"] or summary["offered_rps"])
+        or (p95 is not None and p95 > slo_ms)
+        or summary["error_rate"] + summary["throttle_rate"] > max_error_rate
+    )
+
+
+def print_row(s):
+    lat, q = s["latency_ms"], s["queue_ms"]
+    print(
+        f"{s['offered_rps']:>8} | {s['throughput_rps']:>8} | {lat['p50']!s:>8} {lat['p95']!s:>8} {lat['p99']!s:>8} | "
+        f"{q['p50']!s:>7} {q['p95']!s:>7} | {s['error_rate']:>6.1%} {s['throttle_rate']:>6.1%} | {s['drain_s']:>7}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the SPAR3D API")
+    parser.add_argument("--url", default="http://localhost:3005")
+    parser.add_argument("--rps", default="0.5,1,2,4", help="Offered load steps (requests/second)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds per step")
+    parser.add_argument("--mix", help="JSON file with the request mix (see DEFAULT_MIX)")
+    parser.add_argument("--replay", help="Replay a recorded JSONL request log instead of the mix")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up factor")
+    parser.add_argument("--slo-ms", type=float, default=30000.0, help="p95 latency objective")
+    parser.add_argument("--max-error-rate", type=float, default=0.05)
+    parser.add_argument("--max-outstanding", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--report", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/")
+    # Image paths resolve relative to the mix / replay file, else to this script
+    source = args.replay or args.mix or __file__
+    base_dir = os.path.dirname(os.path.abspath(source))
+    config = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix) as f:
+            config = json.load(f)
+    mix = Mix(config, base_dir, seed=args.seed)
+
+    print(f"{'offered':>8} | {'tput':>8} | {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} | {'q p50':>7} {'q p95':>7} | {'err':>6} {'429':>6} | {'drain s':>7}")
+    report = {"url": url, "slo_ms": args.slo_ms, "steps": [], "saturation_rps": None}
+    if args.replay:
+        records = load_replay(args.replay)
+        span = (records[-1].get("t", 0.0) / args.speed) if records else 0.0
+        started = time.perf_counter()
+        results = asyncio.run(run_replay(url, mix, records, args.speed, args.max_outstanding))
+        drain = max(0.0, time.perf_counter() - started - span)
+        summary = summarize(
+            results, round(len(records) / span, 3) if span else 0.0, span, drain_s=drain
+        )
+        print_row(summary)
+        report["steps"].append(summary)
+    else:
+        for rps in (float(r) for r in args.rps.split(",")):
+            results, dropped, drain = asyncio.run(
+                run_open_loop(url, mix, rps, args.duration, args.max_outstanding, seed=args.seed)
+            )
+            summary = summarize(results, rps, args.duration, dropped, drain)
+            print_row(summary)
+            report["steps"].append(summary)
+            if saturated(summary, args.slo_ms, args.max_error_rate):
+                report["saturation_rps"] = rps
+                print(f"Saturated at {rps} req/s offered")
+                break
+        else:
+            print("No saturation within the offered load steps")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
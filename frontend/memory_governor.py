@@ -0,0 +1,237 @@
+"""
+GPU / host memory governor for the SPAR3D REST server.
+
+Each job's footprint is estimated from `points`, the bake resolution and the
+model's isosurface resolution. Jobs are admitted only while the sum of running
+estimates fits the budget, and a job that still runs out of memory frees the
+allocator caches and is retried once at the next lower tier.
+"""
+
+import asyncio
+import gc
+import os
+import resource
+from contextlib import asynccontextmanager
+
+try:
+    import torch
+except ImportError:  # stub-model servers run without torch; only host memory is governed
+    torch = None
+
+# Bake resolutions to fall back through, highest first
+BAKE_LADDER = (1024, 768, 512, 256)
+MIN_POINTS = 2048
+
+# Rough per-job coefficients (bytes); corrected at runtime from observed peaks
+BASE_BYTES = int(os.environ.get("SPAR3D_MEM_BASE_MB", "512")) * 2**20
+BYTES_PER_POINT = 24 * 1024
+BYTES_PER_TEXEL = 96
+BYTES_PER_VOXEL = 48
+
+
+class MemoryExhausted(Exception):
+    """Raised when a job runs out of memory even at the lowest tier it may use."""
+
+
+def is_oom(exc):
+    oom_type = getattr(torch.cuda, "OutOfMemoryError", None) if torch is not None else None
+    if oom_type is not None and isinstance(exc, oom_type):
+        return True
+    return isinstance(exc, (RuntimeError, MemoryError)) and "out of memory" in str(exc).lower()
+
+
+def _host_rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _host_available_bytes():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES")
+
+
+class MemoryGovernor:
+    def __init__(self, device, isosurface_resolution=160, budget_bytes=None, point_tiers=None):
+        self.device = device
+        # Allowed `points` values (compile buckets); None lets points halve freely
+        self.point_tiers = tuple(sorted(point_tiers)) if point_tiers else None
+        self.cuda = torch is not None and str(device).startswith("cuda") and torch.cuda.is_available()
+        self.isosurface_resolution = isosurface_resolution
+        self.budget_bytes = budget_bytes or self._default_budget()
+        self.reserved_bytes = 0
+        self.active_jobs = 0
+        self.correction = 1.0
+        self.downgrades = 0
+        self.ooms = 0
+        self.gpu_peak_bytes = 0
+        self._cond = asyncio.Condition()
+
+    def _default_budget(self):
+        """Free memory after the model is resident, times SPAR3D_MEM_FRACTION."""
+        fraction = float(os.environ.get("SPAR3D_MEM_FRACTION", "0.9"))
+        if "SPAR3D_MEM_BUDGET_MB" in os.environ:
+            return int(os.environ["SPAR3D_MEM_BUDGET_MB"]) * 2**20
+        if self.cuda:
+            free, _ = torch.cuda.mem_get_info()
+            return int(free * fraction)
+        return int(_host_available_bytes() * fraction)
+
+    def estimate(self, points, bake_resolution):
+        raw = (
+            BASE_BYTES
+            + points * BYTES_PER_POINT
+            + bake_resolution * bake_resolution * BYTES_PER_TEXEL
+            + self.isosurface_resolution ** 3 * BYTES_PER_VOXEL
+        )
+        return int(raw * self.correction)
+
+    def plan(self, points, bake_resolution):
+        """Highest tier at or below the request whose estimate fits the budget."""
+        while self.estimate(points, bake_resolution) > self.budget_bytes:
+            lower = self.lower_tier(points, bake_resolution)
+            if lower is None:
+                break
+            points, bake_resolution = lower
+        return points, bake_resolution
+
+    def lower_tier(self, points, bake_resolution):
+        """
+        Next tier down: one bake-resolution step lower and half the points, or
+        the next lower point tier when the points are bucketed.
+        """
+        lower_bakes = [b for b in BAKE_LADDER if b < bake_resolution]
+        if self.point_tiers:
+            lower = [t for t in self.point_tiers if t < points]
+            lower_points = lower[-1] if lower else points
+        else:
+            lower_points = max(MIN_POINTS, points // 2)
+        if not lower_bakes and lower_points == points:
+            return None
+        return lower_points, lower_bakes[0] if lower_bakes else bake_resolution
+
+    @asynccontextmanager
+    async def admit(self, nbytes):
+        """Wait until nbytes fits next to the running jobs; a lone job is always admitted."""
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: self.active_jobs == 0 or self.reserved_bytes + nbytes <= self.budget_bytes
+            )
+            self.reserved_bytes += nbytes
+            self.active_jobs += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.reserved_bytes -= nbytes
+                self.active_jobs -= 1
+                self._cond.notify_all()
+
+    @asynccontextmanager
+    async def paused(self):
+        """
+        Mark an admitted job as parked between stages.
+
+        Its reservation is kept, but it no longer blocks the "lone job is always
+        admitted" rule, so a job that preempts it cannot deadlock on memory.
+        """
+        async with self._cond:
+            self.active_jobs -= 1
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.active_jobs += 1
+
+    def free_caches(self):
+        gc.collect()
+        if self.cuda:
+            torch.cuda.empty_cache()
+            torch.cuda.ipc_collect()
+
+    def _track_gpu_peak(self):
+        # reset_peak_memory_stats() is used per job, so keep the process peak here
+        if self.cuda:
+            self.gpu_peak_bytes = max(self.gpu_peak_bytes, torch.cuda.max_memory_allocated())
+
+    def observe(self, estimate, peak_bytes):
+        """Move the estimate correction towards the observed peak of a lone job."""
+        if estimate <= 0 or peak_bytes <= 0:
+            return
+        ratio = peak_bytes / (estimate / self.correction)
+        self.correction = max(0.25, 0.8 * self.correction + 0.2 * ratio)
+
+    async def run(self, job, points, bake_resolution):
+        """
+        Run job(points, bake_resolution) under the budget; a plain function runs
+        in a worker thread, a coroutine function is awaited directly.
+
+        Returns (result, points, bake_resolution) with the tier actually used.
+        """
+        planned = self.plan(points, bake_resolution)
+        if planned != (points, bake_resolution):
+            self.downgrades += 1
+        points, bake_resolution = planned
+
+        for attempt in range(2):
+            estimate = self.estimate(points, bake_resolution)
+            try:
+                async with self.admit(estimate):
+                    alone = self.active_jobs == 1
+                    if self.cuda and alone:
+                        self._track_gpu_peak()
+                        torch.cuda.reset_peak_memory_stats()
+                        baseline = torch.cuda.memory_allocated()
+                    if asyncio.iscoroutinefunction(job):
+                        result = await job(points, bake_resolution)
+                    else:
+                        result = await asyncio.to_thread(job, points, bake_resolution)
+                    if self.cuda and alone and self.active_jobs == 1:
+                        self.observe(estimate, torch.cuda.max_memory_allocated() - baseline)
+                return result, points, bake_resolution
+            except Exception as e:
+                if not is_oom(e):
+                    raise
+                self.ooms += 1
+                self.free_caches()
+                lower = self.lower_tier(points, bake_resolution)
+                if attempt == 1 or lower is None:
+                    raise MemoryExhausted(
+                        f"Out of memory at points={points}, bake_resolution={bake_resolution}"
+                    ) from e
+                print(f"OOM at points={points}, bake={bake_resolution}; retrying at {lower}")
+                self.downgrades += 1
+                points, bake_resolution = lower
+
+    def stats(self):
+        stats = {
+            "budget_bytes": self.budget_bytes,
+            "reserved_bytes": self.reserved_bytes,
+            "active_jobs": self.active_jobs,
+            "estimate_correction": round(self.correction, 3),
+            "downgrades": self.downgrades,
+            "ooms": self.ooms,
+            "host_rss_bytes": _host_rss_bytes(),
+            # ru_maxrss is in KiB on Linux
+            "host_peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        }
+        if self.cuda:
+            self._track_gpu_peak()
+            stats.update({
+                "gpu_allocated_bytes": torch.cuda.memory_allocated(),
+                "gpu_reserved_bytes": torch.cuda.memory_reserved(),
+                "gpu_peak_allocated_bytes": self.gpu_peak_bytes,
+            })
+        return stats
@@ -1,50 +1,274 @@
 """
 Minimal REST wrapper for SPAR3D.
 Start inside the container with:  uvicorn serve_rest:app --host 0.0.0.0 --port 3005
+
+Only FastAPI and the stdlib-only helpers are imported up front, so /health and
+/config answer within a second of the process starting. torch, SPAR3D, PIL and
+the NumPy helpers are imported, and the model loaded and warmed up, by a
+background thread. /ready and the model endpoints return 503 until it is done.
 """
 
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+import importlib
+import json
+import random
 import tempfile, os, uuid
-import torch
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import FileResponse
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-import uvicorn
-from inference import run_inference  # komt uit de SPAR3D-repo
-from spar3d.system import SPAR3D
-from spar3d.utils import get_device
+from spar3d_compile import (
+    bucket_points,
+    bucket_report,
+    compile_enabled,
+    compile_model,
+    restore_eager,
+    warmup,
+    warmup_buckets,
+)
+from job_scheduler import JobScheduler, QueueFull, client_key
+
+STUB_MODEL = os.environ.get("SPAR3D_STUB_MODEL", "0") == "1"
+CHECKPOINT_DIR = os.environ.get("SPAR3D_CHECKPOINT_DIR", "checkpoints")
+LOW_VRAM = os.environ.get("SPAR3D_LOW_VRAM", "1") == "1"
+
+# Imported by load_runtime() in this order. Each module is timed on its own, so
+# a shared dependency is charged to the first module that pulls it in.
+if STUB_MODEL:
+    # No GPU / checkpoints / torch needed: for router, load and scheduler testing
+    MODEL_MODULES = ["stub_model"]
+else:
+    MODEL_MODULES = ["torch", "PIL.Image", "inference", "spar3d.utils", "spar3d.system"]  # komen uit de SPAR3D-repo
+HEAVY_MODULES = [
+    "numpy",
+    *MODEL_MODULES,
+    "glb_writer",
+    "body_measurements",
+    "texture_tiers",
+    "memory_governor",
+]
+
+# Set by load_runtime(); request handlers only touch them once startup is ready
+torch = glb_writer = body_measurements = texture_tiers = memory_governor = None
+run_inference = None
+device = None
+model = None
+compiled = False
+governor = None
+
+# Phases: starting -> importing -> loading_model -> warming_up -> ready | failed
+startup = {"phase": "starting", "error": None, "import_ms": {}, "phase_ms": {}}
+_load_lock = threading.Lock()
 
 # Define the request model for text-to-3D inference
 class InferenceRequest(BaseModel):
     prompt: str
     points: int = 20000
     seed: Optional[int] = None
+    return_glb: bool = False
+    priority: Optional[str] = None  # interactive | standard | batch
+    reference_height_cm: Optional[float] = None  # scale measurements to a known height
+
+
+def is_ready():
+    return startup["phase"] == "ready"
+
+
+def timed_import(name):
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    startup["import_ms"][name] = round((time.perf_counter() - started) * 1000.0, 1)
+    return module
+
+
+def load_runtime():
+    """
+    Import the heavy modules, load the model, warm up compiled mode and size
+    the memory budget. Blocking; the server runs it on a background thread,
+    batch_generate calls it directly. Returns True once ready.
+    """
+    global torch, glb_writer, body_measurements, texture_tiers, memory_governor
+    global run_inference, device, model, compiled, governor
+
+    with _load_lock:
+        if startup["phase"] in ("ready", "failed"):
+            return is_ready()
+        started = time.perf_counter()
+        phase_started = started
+
+        def enter(phase):
+            nonlocal phase_started
+            now = time.perf_counter()
+            if startup["phase"] != "starting":
+                startup["phase_ms"][startup["phase"]] = round((now - phase_started) * 1000.0, 1)
+            phase_started = now
+            startup["phase"] = phase
+
+        try:
+            enter("importing")
+            modules = {name: timed_import(name) for name in HEAVY_MODULES}
+            for name, ms in sorted(startup["import_ms"].items(), key=lambda kv: -kv[1]):
+                print(f"  import {name}: {ms:.0f} ms")
+            torch = modules.get("torch")  # None with the stub model
+            glb_writer = modules["glb_writer"]
+            body_measurements = modules["body_measurements"]
+            texture_tiers = modules["texture_tiers"]
+            memory_governor = modules["memory_governor"]
+            if STUB_MODEL:
+                SPAR3D = modules["stub_model"].StubSPAR3D
+                get_device = modules["stub_model"].stub_device
+                run_inference = modules["stub_model"].stub_run_inference
+            else:
+                SPAR3D = modules["spar3d.system"].SPAR3D
+                get_device = modules["spar3d.utils"].get_device
+                run_inference = modules["inference"].run_inference
 
-app = FastAPI(title="SPAR3D API", version="0.1")
+            enter("loading_model")
+            # Load the model for text-to-3D inference
+            device = get_device()
+            print(f"Using device: {device}")
+            # With a manifest, pull verified checkpoint files via the shared node mirror first
+            if os.environ.get("SPAR3D_MODEL_MANIFEST"):
+                from fetch_checkpoints import ensure_files
 
-# Load the model for text-to-3D inference
-device = get_device()
-print(f"Using device: {device}")
+                with open(os.environ["SPAR3D_MODEL_MANIFEST"]) as f:
+                    ensure_files(
+                        json.load(f),
+                        source=os.environ.get("SPAR3D_MODEL_SOURCE", "hf"),
+                        link=CHECKPOINT_DIR,
+                    )
+            loaded = SPAR3D.from_pretrained(
+                CHECKPOINT_DIR,
+                config_name="config.yaml",
+                weight_name="model.safetensors",
+                low_vram_mode=LOW_VRAM,
+            )
+            loaded.to(device)
+            loaded.eval()
+            model = loaded
+            print("Model loaded successfully for text-to-3D inference")
 
-try:
-    model = SPAR3D.from_pretrained(
-        "checkpoints",
-        config_name="config.yaml",
-        weight_name="model.safetensors",
-        low_vram_mode=True,
+            enter("warming_up")
+            # Opt-in compiled mode (SPAR3D_COMPILE=1): compile once per bucket before going ready
+            if compile_enabled() and not STUB_MODEL:
+                try:
+                    compile_model(model)
+                    warmup(model, lambda n: text_to_mesh("warmup", n))
+                    compiled = True
+                except Exception as e:
+                    # Unbucketed requests must not reach the static graphs
+                    restore_eager(model)
+                    print(f"torch.compile warm-up failed, staying eager: {e}")
+
+            # Budget is taken after the model is resident, so it covers per-job memory only
+            governor = memory_governor.MemoryGovernor(
+                device,
+                isosurface_resolution=getattr(getattr(model, "cfg", None), "isosurface_resolution", 160),
+                # Compiled graphs only exist per bucket, so downgrades step through them
+                point_tiers=warmup_buckets() if compiled else None,
+            )
+            enter("ready")
+        except Exception as e:
+            print(f"Error loading model for text-to-3D inference: {e}")
+            startup["error"] = f"{type(e).__name__}: {e}"
+            enter("failed")
+        startup["phase_ms"]["total"] = round((time.perf_counter() - started) * 1000.0, 1)
+        print(f"Startup {startup['phase']} after {startup['phase_ms']['total'] / 1000.0:.1f} s")
+        return is_ready()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Daemon thread: a pod stopped mid-load exits without waiting for the model
+    threading.Thread(target=load_runtime, name="spar3d-loader", daemon=True).start()
+    yield
+
+
+app = FastAPI(title="SPAR3D API", version="0.1", lifespan=lifespan)
+startup["control_plane_ms"] = round((time.perf_counter() - _import_started) * 1000.0, 1)
+
+
+def require_model():
+    """503 with Retry-After while the model is loading or after it failed to load."""
+    if is_ready():
+        return
+    if startup["phase"] == "failed":
+        raise HTTPException(status_code=503, detail=f"Model failed to load: {startup['error']}")
+    raise HTTPException(
+        status_code=503,
+        detail=f"Model is loading ({startup['phase']})",
+        headers={"Retry-After": "10"},
     )
-    model.to(device)
-    model.eval()
-    print("Model loaded successfully for text-to-3D inference")
-except Exception as e:
-    print(f"Error loading model for text-to-3D inference: {e}")
-    model = None
+
+
+@contextmanager
+def inference_mode():
+    """no_grad + fp16 autocast; a no-op for the stub model, which runs without torch."""
+    if torch is None:
+        yield
+        return
+    with torch.no_grad():
+        with torch.autocast(device_type=device, dtype=torch.float16):
+            yield
+
+
+# The pipeline is split into stages so lower-priority jobs can yield in between
+def sample_stage(prompt: str, num_points: int):
+    with inference_mode():
+        return model.sample_points(
+            [prompt],
+            num_points=num_points,
+        )
+
+
+def reconstruct_stage(points, bake_resolution: int = 1024):
+    with inference_mode():
+        mesh, _ = model.reconstruct_mesh(
+            points,
+            bake_resolution=bake_resolution,
+            remesh="none",
+            vertex_count=-1,
+            return_points=False,
+        )
+    if isinstance(mesh, list):
+        mesh = mesh[0]
+    return mesh
+
+
+def text_to_mesh(prompt: str, num_points: int, bake_resolution: int = 1024):
+    return reconstruct_stage(sample_stage(prompt, num_points), bake_resolution)
+
+
+scheduler = JobScheduler()
+
+
+def request_priority(http_request: Request, priority: Optional[str] = None):
+    """Priority class from the body, else the X-Priority header; client key for fair queuing."""
+    priority = priority or http_request.headers.get("x-priority")
+    client = client_key(http_request.headers, http_request.client.host if http_request.client else "")
+    return JobScheduler.normalize(priority), client
+
+
+async def checkpoint(ticket):
+    """Stage boundary: park the job (memory stays reserved) if higher-priority work waits."""
+    if scheduler.should_yield(ticket):
+        async with governor.paused():
+            await scheduler.checkpoint(ticket)
 
 @app.post("/generate")
 async def generate(
+    http_request: Request,
     image: UploadFile = File(...),
     prompt: str = Form("")
 ):
+    require_model()
+
     # --- save uploaded image to temp file ---
     suffix = os.path.splitext(image.filename)[-1] or ".png"
     with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
@@ -56,23 +280,42 @@ async def generate(
         tempfile.gettempdir(), f"{uuid.uuid4().hex}.glb"
     )
 
-    # --- run SPAR3D inference ---
-    run_inference(
-        img_path=img_path,
-        prompt=prompt,
-        output_path=out_path,
-        fp16=True  # half precision -> minder VRAM
-    )
+    # --- run SPAR3D inference (fixed settings, so admit at the default tier) ---
+    # run_inference is a single stage, so /generate jobs cannot yield mid-way
+    try:
+        async with scheduler.slot(*request_priority(http_request)) as ticket:
+            async with governor.admit(governor.estimate(20000, 1024)):
+                await asyncio.to_thread(
+                    run_inference,
+                    img_path=img_path,
+                    prompt=prompt,
+                    output_path=out_path,
+                    fp16=True  # half precision -> minder VRAM
+                )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        # No lower tier to retry at (run_inference has fixed settings): free and shed
+        if not memory_governor.is_oom(e):
+            raise
+        governor.ooms += 1
+        governor.free_caches()
+        raise HTTPException(
+            status_code=503,
+            detail="Out of memory during image-to-3D inference",
+            headers={"Retry-After": "30"},
+        )
 
     # --- stream GLB back ---
     return FileResponse(
         out_path,
         media_type="model/gltf-binary",
-        filename="model.glb"
+        filename="model.glb",
+        headers={"X-Queue-Wait-Ms": f"{ticket.wait_s * 1000:.0f}"},
     )
 
 @app.post("/inference")
-async def inference(request: InferenceRequest):
+async def inference(request: InferenceRequest, http_request: Request, response: Response):
     """
     Generate a 3D model from a text prompt.
     
@@ -80,56 +323,188 @@ async def inference(request: InferenceRequest):
         prompt: Text description of the 3D model to generate
         points: Number of points to generate (default: 20000)
         seed: Random seed for reproducibility (optional)
+        return_glb: Stream the GLB back as the response body instead of a path
+        priority: interactive, standard (default) or batch; X-Priority header also works
+        reference_height_cm: Known body height used to scale the measurements (optional)
         
     Returns:
         model_uri: Path to the generated GLB file
         points: Number of points used
         seed: Seed used for generation
+        measurements: heightCm / chestCm / waistCm / hipCm (None without
+            reference_height_cm) and circumference-to-height ratios
     """
-    if model is None:
-        raise HTTPException(status_code=500, detail="Model not loaded for text-to-3D inference")
+    require_model()
     
-    # Set seed if provided
-    if request.seed is not None:
-        torch.manual_seed(request.seed)
-    else:
-        # Generate a random seed
-        request.seed = torch.randint(0, 2**32 - 1, (1,)).item()
+    # Pick a seed up front so it can be reported; it is applied in the job thread
+    if request.seed is None:
+        request.seed = random.randrange(2**32 - 1)
     
     # Create output directory
     timestamp = uuid.uuid4().hex
     out_dir = os.path.join("/tmp/out", timestamp)
     os.makedirs(out_dir, exist_ok=True)
     out_path = os.path.join(out_dir, "model.glb")
-    
+
+    priority, client = request_priority(http_request, request.priority)
+
+    # In compiled mode round points to a warmed bucket, clamped to the largest:
+    # an unbucketed shape would recompile the static graphs mid-request. Done
+    # before the governor plans, so the estimate covers the points actually run.
+    requested_points = bucket_points(request.points) if compiled else request.points
+
+    async def job(num_points, bake_resolution):
+        def sample():
+            # The torch RNG is global: seeds are only reproducible one job at a time
+            if torch is not None:
+                torch.manual_seed(request.seed)
+            return sample_stage(request.prompt, num_points)
+
+        points = await asyncio.to_thread(sample)
+        await checkpoint(ticket)
+        mesh = await asyncio.to_thread(reconstruct_stage, points, bake_resolution)
+        await checkpoint(ticket)
+        return await asyncio.to_thread(finish, mesh)
+
+    def finish(mesh):
+        # Export mesh straight from its arrays (no exporter round-trip)
+        glb = glb_writer.mesh_to_glb(mesh)
+        measurements = body_measurements.measure_mesh(mesh.vertices, mesh.faces, request.reference_height_cm)
+        with open(os.path.join(out_dir, body_measurements.MEASUREMENTS_FILE), "w") as f:
+            json.dump(measurements, f)
+        return glb, measurements
+
     try:
-        # Run inference
-        with torch.no_grad():
-            with torch.autocast(device_type=device, dtype=torch.float16):
-                points = model.sample_points(
-                    [request.prompt],
-                    num_points=request.points,
-                )
-                mesh, _ = model.reconstruct_mesh(
-                    points,
-                    bake_resolution=1024,
-                    remesh="none",
-                    vertex_count=-1,
-                    return_points=False,
-                )
-        
-        # Export mesh
-        if isinstance(mesh, list):
-            mesh = mesh[0]
-        mesh.export(out_path, include_normals=True)
+        async with scheduler.slot(priority, client) as ticket:
+            # Run inference under the memory budget, downgrading on OOM
+            (glb, measurements), num_points, bake_resolution = await governor.run(
+                job, requested_points, 1024
+            )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except memory_governor.MemoryExhausted as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except Exception as e:
+        print(f"Error during inference: {e}")
+        raise HTTPException(status_code=500, detail=f"Inference failed: {type(e).__name__}")
+
+    try:
+        # Texture tiers are produced off the inference thread; best-effort, the model is done
+        texture_tiers.submit(glb, out_dir)
+    except Exception as e:
+        print(f"Texture tiers not queued for {out_dir}: {type(e).__name__}: {e}")
+
+    try:
+        if request.return_glb:
+            return StreamingResponse(
+                glb_writer.iter_chunks(glb),
+                media_type="model/gltf-binary",
+                headers={
+                    "Content-Length": str(len(glb)),
+                    "Content-Disposition": 'attachment; filename="model.glb"',
+                    "X-Points": str(num_points),
+                    "X-Seed": str(request.seed),
+                    "X-Bake-Resolution": str(bake_resolution),
+                    "X-Measurements": json.dumps(measurements),
+                    "X-Queue-Wait-Ms": f"{ticket.wait_s * 1000:.0f}",
+                },
+            )
+        with open(out_path, "wb") as f:
+            f.write(glb)
+        response.headers["X-Queue-Wait-Ms"] = f"{ticket.wait_s * 1000:.0f}"
         
         return {
             "model_uri": out_path,
-            "points": request.points,
-            "seed": request.seed
+            "points": num_points,
+            "seed": request.seed,
+            "bake_resolution": bake_resolution,
+            "measurements": measurements,
+            "asset_id": timestamp,
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        print(f"Error returning inference result: {e}")
+        raise HTTPException(status_code=500, detail=f"Returning the model failed: {type(e).__name__}")
+
+@app.get("/assets/{asset_id}/textures")
+async def asset_textures(asset_id: str):
+    """Per-tier texture transcoding results and byte savings for an asset."""
+    # texture_tiers pulls in NumPy, which the control plane must not import
+    require_model()
+    out_dir = os.path.join("/tmp/out", os.path.basename(asset_id))
+    stats = texture_tiers.load_stats(out_dir)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No texture tiers for this asset (yet)")
+    return stats
+
+@app.get("/health")
+async def health():
+    """
+    Liveness: the process is up and serving HTTP, whether or not the model has
+    loaded yet. A failed load is not retried, so it fails liveness too and the
+    orchestrator restarts the pod.
+    """
+    if startup["phase"] == "failed":
+        return JSONResponse(status_code=500, content={"status": "failed", "error": startup["error"]})
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness for load balancers: model loaded, plus queue state for load shedding."""
+    body = {
+        "ready": is_ready(),
+        "phase": startup["phase"],
+        "error": startup["error"],
+        "queue": scheduler.stats(),
+    }
+    if not is_ready():
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@app.get("/config")
+async def config():
+    """Server settings and startup timings (control plane, per-module imports, load phases)."""
+    return {
+        "stub_model": STUB_MODEL,
+        "checkpoint_dir": CHECKPOINT_DIR,
+        "low_vram": LOW_VRAM,
+        "compile": compile_enabled(),
+        "compiled": compiled,
+        "device": device,
+        "texture_tiers": os.environ.get("SPAR3D_TEXTURE_TIERS", ""),
+        # Copies: the loader thread may still be adding entries
+        "startup": {**startup, "import_ms": dict(startup["import_ms"]), "phase_ms": dict(startup["phase_ms"])},
+    }
+
+@app.get("/queue")
+async def queue():
+    """Active and waiting jobs per priority class."""
+    return scheduler.stats()
+
+@app.get("/memory")
+async def memory():
+    """Memory budget, current and peak usage, and OOM/downgrade counters."""
+    require_model()
+    return governor.stats()
+
+@app.get("/assets/{asset_id}/measurements")
+async def asset_measurements(asset_id: str):
+    """Body measurements cached with the asset when it was generated."""
+    require_model()
+    path = os.path.join("/tmp/out", os.path.basename(asset_id), body_measurements.MEASUREMENTS_FILE)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No measurements for this asset")
+    with open(path) as f:
+        return json.load(f)
+
+@app.get("/compile/report")
+async def compile_report():
+    """Eager vs compiled latency per warmed point bucket."""
+    return {
+        "enabled": compiled,
+        "buckets": {str(k): v for k, v in bucket_report.items()},
+    }
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=3005)
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Opt-in torch.compile path for the SPAR3D REST server.
+
+Enable with SPAR3D_COMPILE=1. `points` is rounded up to a small set of buckets
+so every hot submodule is compiled once per bucket, and the inductor graph cache
+lives in SPAR3D_COMPILE_CACHE so restarts reuse it. Only the text-to-3D stages
+run on the compiled model; /generate goes through the SPAR3D repo's
+run_inference, which loads its own model, so uploads are not bucketed.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+POINT_BUCKETS = (4096, 8192, 16384, 20000, 32768, 65536)
+
+# Submodules of spar3d.system.SPAR3D that dominate a request; missing ones are skipped.
+# The decoder stays eager: its shapes follow bake_resolution, which the memory
+# governor lowers on demand (1024/768/512/256), and only 1024 is warmed.
+COMPILE_MODULES = ("image_tokenizer", "point_embedder", "backbone")
+
+CACHE_DIR = os.environ.get("SPAR3D_COMPILE_CACHE", "/app/data/compile-cache")
+REPORT_FILE = "warmup_report.json"
+
+# bucket -> {"eager_ms", "first_compiled_ms", "compiled_ms", "speedup"}
+bucket_report = {}
+
+
+def compile_enabled():
+    return os.environ.get("SPAR3D_COMPILE", "0") == "1"
+
+
+def warmup_buckets():
+    """Point buckets to warm at startup (SPAR3D_COMPILE_WARMUP=4096,20000 narrows it)."""
+    raw = os.environ.get("SPAR3D_COMPILE_WARMUP", "")
+    buckets = tuple(b for b in POINT_BUCKETS if str(b) in raw.split(","))
+    return buckets or POINT_BUCKETS
+
+
+def bucket_points(num_points):
+    """Smallest warmed point bucket >= num_points, clamped to the largest warmed bucket."""
+    buckets = warmup_buckets()
+    for bucket in buckets:
+        if num_points <= bucket:
+            return bucket
+    return buckets[-1]
+
+
+def configure_cache(cache_dir=CACHE_DIR):
+    """Point the inductor FX-graph cache at a persistent directory."""
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", cache_dir)
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+
+    import torch._inductor.config as inductor_config
+
+    inductor_config.fx_graph_cache = True
+
+
+def compile_model(model, modules=COMPILE_MODULES):
+    """Replace the hot submodules of model with torch.compile'd wrappers in place."""
+    import torch
+
+    configure_cache()
+    compiled = []
+    for name in modules:
+        submodule = getattr(model, name, None)
+        if submodule is None:
+            continue
+        # Buckets give fixed shapes, so static graphs avoid dynamic-shape guards
+        setattr(model, name, torch.compile(submodule, dynamic=False))
+        compiled.append(name)
+    print(f"torch.compile enabled for: {', '.join(compiled) or 'nothing'}")
+    return compiled
+
+
+@contextmanager
+def eager_modules(model, modules=COMPILE_MODULES):
+    """
+    Temporarily swap compiled submodules back to their eager originals.
+
+    This patches the shared model, so it is only safe while nothing else runs
+    on it (the startup warm-up). Requests never run eager in compiled mode.
+    """
+    swapped = {}
+    for name in modules:
+        submodule = getattr(model, name, None)
+        original = getattr(submodule, "_orig_mod", None)
+        if original is not None:
+            swapped[name] = submodule
+            setattr(model, name, original)
+    try:
+        yield
+    finally:
+        for name, submodule in swapped.items():
+            setattr(model, name, submodule)
+
+
+def restore_eager(model, modules=COMPILE_MODULES):
+    """Undo compile_model: put the eager originals back for good."""
+    for name in modules:
+        original = getattr(getattr(model, name, None), "_orig_mod", None)
+        if original is not None:
+            setattr(model, name, original)
+
+
+def _timed_ms(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000.0
+
+
+def warmup(model, run_fn, buckets=None, cache_dir=CACHE_DIR):
+    """
+    Compile every point bucket once and record eager vs compiled latency.
+
+    run_fn(num_points) must run one full text-to-mesh pass on the model.
+    The report is kept in `bucket_report` and written to the cache directory.
+    """
+    for bucket in buckets or warmup_buckets():
+        with eager_modules(model):
+            eager_ms = _timed_ms(lambda: run_fn(bucket))
+        first_ms = _timed_ms(lambda: run_fn(bucket))
+        compiled_ms = _timed_ms(lambda: run_fn(bucket))
+        bucket_report[bucket] = {
+            "eager_ms": round(eager_ms, 1),
+            "first_compiled_ms": round(first_ms, 1),
+            "compiled_ms": round(compiled_ms, 1),
+            "speedup": round(eager_ms / compiled_ms, 2) if compiled_ms else None,
+        }
+        print(
+            f"[compile] points={bucket}: eager {eager_ms:.0f} ms, "
+            f"first compiled {first_ms:.0f} ms, compiled {compiled_ms:.0f} ms"
+        )
+
+    with open(os.path.join(cache_dir, REPORT_FILE), "w") as f:
+        json.dump({str(k): v for k, v in bucket_report.items()}, f, indent=2)
+    return bucket_report
@@ -0,0 +1,312 @@
+"""
+Cache-affinity router in front of several SPAR3D containers.
+
+Proxies /generate and /inference and picks the replica by consistent hashing
+of the input fingerprint. Repeat inputs then land on the replica that already
+has them warm, and adding a replica only remaps about 1/N of the keys.
+Replicas are health-checked through their /ready endpoint. A replica whose
+queue for the request's priority class is full is skipped for the next one on
+the ring, and when both are full the router answers 429. Response bodies (GLBs) are streamed through without
+buffering.
+
+  python spar3d_router.py --replicas http://gpu1:3005,http://gpu2:3005
+  python spar3d_router.py --stub-replicas 3      # local test with stub models
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from job_scheduler import JobScheduler
+
+VIRTUAL_NODES = 128
+HEALTH_INTERVAL_S = float(os.environ.get("SPAR3D_ROUTER_HEALTH_INTERVAL", "2"))
+MAX_INFLIGHT = int(os.environ.get("SPAR3D_ROUTER_MAX_INFLIGHT", "16"))
+# Hop-by-hop headers must not be forwarded by a proxy
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade"}
+# httpx recomputes these for the upstream request
+REQUEST_SKIP = HOP_HEADERS | {"host", "content-length"}
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, nodes=(), vnodes=VIRTUAL_NODES):
+        self.vnodes = vnodes
+        self._keys = []
+        self._nodes = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for i in range(self.vnodes):
+            key = _hash(f"{node}#{i}".encode())
+            index = bisect.bisect(self._keys, key)
+            self._keys.insert(index, key)
+            self._nodes.insert(index, node)
+
+    def remove(self, node):
+        keep = [(k, n) for k, n in zip(self._keys, self._nodes) if n != node]
+        self._keys = [k for k, _ in keep]
+        self._nodes = [n for _, n in keep]
+
+    def walk(self, fingerprint):
+        """Distinct nodes in ring order starting at the fingerprint's position."""
+        if not self._keys:
+            return
+        start = bisect.bisect(self._keys, _hash(fingerprint))
+        seen = set()
+        for i in range(len(self._keys)):
+            node = self._nodes[(start + i) % len(self._keys)]
+            if node not in seen:
+                seen.add(node)
+                yield node
+
+
+class Replica:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.healthy = False
+        # Priority classes whose queue on the replica is at its limit
+        self.full_classes = set()
+        self.inflight = 0
+        self.checked_at = 0.0
+        self.routed = 0
+
+    def available(self, priority):
+        return self.healthy and priority not in self.full_classes and self.inflight < MAX_INFLIGHT
+
+
+def full_classes(queue_stats):
+    """Priority classes on the replica that have reached their queue limit."""
+    return {
+        priority
+        for priority, stats in queue_stats.get("classes", {}).items()
+        if stats["waiting"] >= stats["queue_limit"]
+    }
+
+
+def request_priority(headers, body, content_type):
+    """Priority class as the replica will see it: the JSON `priority` field, else X-Priority."""
+    priority = None
+    if "application/json" in content_type:
+        try:
+            priority = json.loads(body).get("priority")
+        except (ValueError, AttributeError):
+            pass
+    return JobScheduler.normalize(priority or headers.get("x-priority"))
+
+
+def fingerprint(path, body, content_type):
+    """Stable input key: canonical JSON for /inference, boundary-free body for /generate."""
+    if "multipart/form-data" in content_type and "boundary=" in content_type:
+        boundary = content_type.split("boundary=", 1)[1].split(";")[0].strip('"').encode()
+        body = body.replace(boundary, b"")
+    elif "application/json" in content_type:
+        try:
+            payload = json.loads(body)
+            body = json.dumps(
+                {k: payload.get(k) for k in ("prompt", "points", "seed")}, sort_keys=True
+            ).encode()
+        except (ValueError, AttributeError):
+            pass
+    return path.encode() + b"\0" + hashlib.sha256(body).digest()
+
+
+class Router:
+    def __init__(self, urls):
+        self.replicas = {url.rstrip("/"): Replica(url) for url in urls}
+        self.ring = HashRing(self.replicas)
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(600.0, connect=5.0))
+        self.shed = 0
+
+    async def check(self, replica):
+        try:
+            response = await self.client.get(f"{replica.url}/ready", timeout=2.0)
+            body = response.json()
+            replica.healthy = response.status_code == 200 and body.get("ready", False)
+            replica.full_classes = full_classes(body.get("queue", {}))
+        except (httpx.HTTPError, ValueError):
+            replica.healthy = False
+        replica.checked_at = time.time()
+
+    async def health_loop(self):
+        while True:
+            await asyncio.gather(*(self.check(r) for r in self.replicas.values()))
+            await asyncio.sleep(HEALTH_INTERVAL_S)
+
+    def candidates(self, key):
+        """Owner of the key first, then its ring successor: at most two tries."""
+        healthy = [self.replicas[url] for url in self.ring.walk(key) if self.replicas[url].healthy]
+        return healthy[:2]
+
+    async def forward(self, request, path):
+        body = await request.body()
+        content_type = request.headers.get("content-type", "")
+        key = fingerprint(path, body, content_type)
+        priority = request_priority(request.headers, body, content_type)
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in REQUEST_SKIP}
+
+        candidates = self.candidates(key)
+        if not candidates:
+            return JSONResponse(status_code=503, content={"detail": "No ready SPAR3D replicas"})
+        for replica in candidates:
+            if not replica.available(priority):
+                continue
+            replica.inflight += 1
+            try:
+                upstream = await self.client.send(
+                    self.client.build_request("POST", f"{replica.url}{path}", content=body, headers=headers),
+                    stream=True,
+                )
+            except httpx.HTTPError:
+                replica.inflight -= 1
+                replica.healthy = False
+                continue
+            if upstream.status_code == 429:
+                # This class's queue filled up since the last health check: try the successor
+                replica.full_classes.add(priority)
+                replica.inflight -= 1
+                await upstream.aclose()
+                continue
+            replica.routed += 1
+
+            async def relay(replica=replica, upstream=upstream):
+                # Starlette skips background tasks when streaming fails (upstream read
+                # error, client disconnect), so release the replica here instead
+                try:
+                    yield b""
+                    async for chunk in upstream.aiter_raw():
+                        yield chunk
+                finally:
+                    replica.inflight -= 1
+                    await upstream.aclose()
+
+            body_stream = relay()
+            # Enter the try block now: a generator that never starts never runs its finally
+            await body_stream.__anext__()
+            response_headers = {
+                k: v for k, v in upstream.headers.items() if k.lower() not in HOP_HEADERS
+            }
+            response_headers["X-Replica"] = replica.url
+            return StreamingResponse(
+                body_stream,
+                status_code=upstream.status_code,
+                headers=response_headers,
+            )
+
+        self.shed += 1
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "All candidate replicas are at capacity"},
+            headers={"Retry-After": "5"},
+        )
+
+    def stats(self):
+        return {
+            "shed": self.shed,
+            "replicas": [
+                {
+                    "url": r.url,
+                    "healthy": r.healthy,
+                    "full_classes": sorted(r.full_classes),
+                    "inflight": r.inflight,
+                    "routed": r.routed,
+                    "checked_at": r.checked_at,
+                }
+                for r in self.replicas.values()
+            ],
+        }
+
+
+def create_app(urls):
+    router = Router(urls)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        task = asyncio.create_task(router.health_loop())
+        yield
+        task.cancel()
+        await router.client.aclose()
+
+    app = FastAPI(title="SPAR3D Router", version="0.1", lifespan=lifespan)
+    app.state.router = router
+
+    @app.post("/generate")
+    async def generate(request: Request):
+        return await router.forward(request, "/generate")
+
+    @app.post("/inference")
+    async def inference(request: Request):
+        return await router.forward(request, "/inference")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/replicas")
+    async def replicas():
+        return router.stats()
+
+    return app
+
+
+def spawn_stub_replicas(count, base_port):
+    """Start `count` serve_rest processes with stub models on consecutive ports."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, SPAR3D_STUB_MODEL="1")
+    processes, urls = [], []
+    for i in range(count):
+        port = base_port + i
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "modified_serve_rest:app", "--port", str(port)],
+                cwd=here,
+                env=env,
+            )
+        )
+        urls.append(f"http://127.0.0.1:{port}")
+    return processes, urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache-affinity router for SPAR3D replicas")
+    parser.add_argument("--replicas", default=os.environ.get("SPAR3D_REPLICAS", ""),
+                        help="Comma-separated replica base URLs")
+    parser.add_argument("--stub-replicas", type=int, default=0,
+                        help="Spawn this many local stub-model servers instead")
+    parser.add_argument("--stub-base-port", type=int, default=3101)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=3005)
+    args = parser.parse_args()
+
+    processes = []
+    urls = [u for u in args.replicas.split(",") if u]
+    if args.stub_replicas:
+        processes, stub_urls = spawn_stub_replicas(args.stub_replicas, args.stub_base_port)
+        urls += stub_urls
+    if not urls:
+        parser.error("no replicas: pass --replicas or --stub-replicas")
+    try:
+        uvicorn.run(create_app(urls), host=args.host, port=args.port)
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Stand-in for spar3d.system.SPAR3D so the REST server can run without a GPU or
+checkpoints. Enable with SPAR3D_STUB_MODEL=1; SPAR3D_STUB_LATENCY_MS sets how
+long each pipeline stage pretends to take. Used to exercise the router, load
+generator and scheduler locally.
+"""
+
+import os
+import time
+import zlib
+
+import numpy as np
+
+STAGE_LATENCY_S = float(os.environ.get("SPAR3D_STUB_LATENCY_MS", "200")) / 1000.0
+
+
+class StubMesh:
+    """The subset of trimesh.Trimesh that glb_writer and body_measurements use."""
+
+    def __init__(self, vertices, faces):
+        self.vertices = vertices
+        self.faces = faces
+        self.visual = None
+
+    @property
+    def vertex_normals(self):
+        tris = self.vertices[self.faces]
+        face_normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+        normals = np.zeros_like(self.vertices)
+        for corner in range(3):
+            np.add.at(normals, self.faces[:, corner], face_normals)
+        return normals / np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+
+
+def body_mesh(rings=64, segments=48, height=1.75):
+    """A lathed body-like solid of revolution, Y-up, standing on y=0."""
+    y = np.linspace(0.0, height, rings)
+    # Rough torso profile: radius swells at hips and chest, narrows at waist and neck
+    radius = 0.10 + 0.05 * np.sin(np.pi * y / height) + 0.02 * np.cos(6 * np.pi * y / height)
+    theta = np.linspace(0.0, 2 * np.pi, segments, endpoint=False)
+    vertices = np.stack(
+        [
+            np.outer(radius, np.cos(theta)).ravel(),
+            np.repeat(y, segments),
+            np.outer(radius, np.sin(theta)).ravel(),
+        ],
+        axis=1,
+    )
+    ring = np.arange(segments)
+    nxt = (ring + 1) % segments
+    base = (np.arange(rings - 1) * segments)[:, None]
+    a, b = base + ring, base + nxt
+    c, d = a + segments, b + segments
+    faces = np.concatenate([np.stack([a, c, b], -1), np.stack([b, c, d], -1)], axis=1).reshape(-1, 3)
+    return StubMesh(vertices.astype(np.float32), faces)
+
+
+class StubSPAR3D:
+    cfg = None
+
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+    def sample_points(self, prompts, num_points=20000):
+        time.sleep(STAGE_LATENCY_S)
+        rng = np.random.default_rng(zlib.crc32(prompts[0].encode("utf-8")))
+        return [rng.standard_normal((num_points, 3)).astype(np.float32) for _ in prompts]
+
+    def reconstruct_mesh(self, points, bake_resolution=1024, **kwargs):
+        time.sleep(STAGE_LATENCY_S)
+        # Finer lathe for more points, so export cost tracks the request size
+        rings = int(np.clip(len(points[0]) // 300, 16, 256))
+        return [body_mesh(rings=rings) for _ in points], None
+
+    def run_image(self, images, bake_resolution=1024, **kwargs):
+        time.sleep(2 * STAGE_LATENCY_S)
+        return [body_mesh() for _ in images], None
+
+
+def stub_run_inference(img_path, prompt, output_path, fp16=True):
+    """Mirror of the SPAR3D repo's run_inference signature used by /generate."""
+    from glb_writer import mesh_to_glb
+
+    time.sleep(2 * STAGE_LATENCY_S)
+    with open(output_path, "wb") as f:
+        f.write(mesh_to_glb(body_mesh()))
+
+
+def stub_device():
+    return "cpu"
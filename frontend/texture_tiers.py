@@ -0,0 +1,218 @@
+"""
+Post-export texture stage for generated GLBs.
+
+The 1024x1024 baked texture is embedded losslessly by the exporter and is often
+the bulk of the payload. For each quality tier this downsamples the textures,
+re-encodes them (JPEG / WebP, or KTX2 when a local `toktx` is installed), writes
+the mip chain next to the asset and records the byte savings. Work runs in a
+process pool so it never blocks the inference thread.
+"""
+
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from glb_writer import pad4, parse_glb, pack_glb
+
+# tier -> max texture side, web format and quality; "ktx2" prefers GPU-compressed output
+TIERS = {
+    "high": {"size": 1024, "format": "WEBP", "quality": 90, "ktx2": "uastc"},
+    "standard": {"size": 512, "format": "WEBP", "quality": 80, "ktx2": "etc1s"},
+    "draft": {"size": 256, "format": "JPEG", "quality": 70, "ktx2": None},
+}
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "KTX2": "image/ktx2"}
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "KTX2": "ktx2"}
+# Formats that glTF core does not cover and need a texture extension
+TEXTURE_EXTENSIONS = {"WEBP": "EXT_texture_webp", "KTX2": "KHR_texture_basisu"}
+
+STATS_FILE = "textures.json"
+
+_pool = None
+
+
+def enabled_tiers():
+    """Tiers to produce after export (SPAR3D_TEXTURE_TIERS=standard,draft; empty disables)."""
+    raw = os.environ.get("SPAR3D_TEXTURE_TIERS", "")
+    return [t for t in raw.split(",") if t in TIERS]
+
+
+def ktx2_encoder():
+    return shutil.which(os.environ.get("SPAR3D_TOKTX", "toktx"))
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        workers = int(os.environ.get("SPAR3D_TEXTURE_WORKERS", "2"))
+        # spawn: the server is multi-threaded and holds a CUDA context, neither survives fork
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def mip_chain(image):
+    """Full mip chain of image, halving with a box filter down to 1x1."""
+    levels = [image]
+    while max(levels[-1].size) > 1:
+        prev = levels[-1]
+        levels.append(prev.reduce((2 if prev.width > 1 else 1, 2 if prev.height > 1 else 1)))
+    return levels
+
+
+def _encode_web(image, fmt, quality):
+    out = io.BytesIO()
+    if fmt == "JPEG":
+        image = image.convert("RGB")
+        image.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(out, format="WEBP", quality=quality, method=4)
+    return out.getvalue()
+
+
+def _encode_ktx2(encoder, image, mode):
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "in.png")
+        dst = os.path.join(tmp, "out.ktx2")
+        image.save(src, format="PNG")
+        subprocess.run(
+            [encoder, "--t2", "--encode", mode, "--genmipmap", dst, src],
+            check=True,
+            capture_output=True,
+        )
+        with open(dst, "rb") as f:
+            return f.read()
+
+
+def transcode_glb(glb, tier, mip_dir=None):
+    """
+    Re-encode every image in glb for tier and return (new_glb, stats).
+
+    When mip_dir is given, the mip chain of each re-encoded web texture is
+    written there as <image>_mip<level>.<ext> for progressive loading.
+    """
+    from PIL import Image
+
+    settings = TIERS[tier]
+    gltf, bin_chunk = parse_glb(glb)
+    encoder = ktx2_encoder() if settings["ktx2"] else None
+    fmt = "KTX2" if encoder else settings["format"]
+
+    replacements = {}
+    before = after = 0
+    for image_index, image_def in enumerate(gltf.get("images", [])):
+        view_index = image_def.get("bufferView")
+        if view_index is None:
+            continue
+        view_def = gltf["bufferViews"][view_index]
+        start = view_def.get("byteOffset", 0)
+        raw = bin_chunk[start:start + view_def["byteLength"]]
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+        image.thumbnail((settings["size"], settings["size"]), Image.LANCZOS)
+
+        if encoder:
+            data = _encode_ktx2(encoder, image, settings["ktx2"])
+        else:
+            data = _encode_web(image, fmt, settings["quality"])
+            if mip_dir:
+                os.makedirs(mip_dir, exist_ok=True)
+                for level, mip in enumerate(mip_chain(image)):
+                    name = f"{image_index}_mip{level}.{EXTENSIONS[fmt]}"
+                    with open(os.path.join(mip_dir, name), "wb") as f:
+                        f.write(_encode_web(mip, fmt, settings["quality"]))
+
+        replacements[view_index] = data
+        image_def["mimeType"] = MIME_TYPES[fmt]
+        before += len(raw)
+        after += len(data)
+
+    if fmt in TEXTURE_EXTENSIONS and replacements:
+        extension = TEXTURE_EXTENSIONS[fmt]
+        for texture in gltf.get("textures", []):
+            source = texture.pop("source", None)
+            if source is not None:
+                texture.setdefault("extensions", {})[extension] = {"source": source}
+        for key in ("extensionsUsed", "extensionsRequired"):
+            if extension not in gltf.setdefault(key, []):
+                gltf[key].append(extension)
+
+    # Re-lay the BIN chunk with the new image sizes
+    parts = []
+    offset = 0
+    for view_index, view_def in enumerate(gltf.get("bufferViews", [])):
+        data = replacements.get(view_index)
+        if data is None:
+            start = view_def.get("byteOffset", 0)
+            data = bin_chunk[start:start + view_def["byteLength"]]
+        view_def["byteOffset"] = offset
+        view_def["byteLength"] = len(data)
+        parts.append((offset, data))
+        offset = pad4(offset + len(data))
+    if gltf.get("buffers"):
+        gltf["buffers"][0]["byteLength"] = offset
+
+    out = pack_glb(gltf, parts, offset)
+    stats = {
+        "format": fmt,
+        "texture_bytes_before": before,
+        "texture_bytes_after": after,
+        "glb_bytes_before": len(glb),
+        "glb_bytes_after": len(out),
+        "saved_bytes": len(glb) - len(out),
+    }
+    return out, stats
+
+
+def transcode_asset(glb, out_dir, tiers):
+    """
+    Worker entry point: write model.<tier>.glb and mips for each tier into
+    out_dir and record the per-tier savings in out_dir/textures.json.
+    """
+    report = {}
+    for tier in tiers:
+        out, stats = transcode_glb(glb, tier, mip_dir=os.path.join(out_dir, "mips", tier))
+        path = os.path.join(out_dir, f"model.{tier}.glb")
+        with open(path, "wb") as f:
+            f.write(out)
+        report[tier] = dict(stats, path=path)
+    with open(os.path.join(out_dir, STATS_FILE), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def submit(glb, out_dir, tiers=None):
+    """Queue transcoding of glb on the worker pool; returns the Future or None."""
+    tiers = tiers or enabled_tiers()
+    if not tiers:
+        return None
+    global _pool
+    try:
+        future = get_pool().submit(transcode_asset, bytes(glb), out_dir, tiers)
+    except BrokenProcessPool:
+        # A worker died; drop the pool so the next asset gets a fresh one
+        _pool = None
+        raise
+
+    def _log(done):
+        if done.exception() is not None:
+            print(f"Texture transcoding failed for {out_dir}: {done.exception()}")
+            return
+        for tier, stats in done.result().items():
+            print(f"[textures] {out_dir} {tier}: saved {stats['saved_bytes']} bytes ({stats['format']})")
+
+    future.add_done_callback(_log)
+    return future
+
+
+def load_stats(out_dir):
+    path = os.path.join(out_dir, STATS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)